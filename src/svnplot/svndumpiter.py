@@ -0,0 +1,639 @@
+'''
+svndumpiter.py
+Copyright (C) 2009 Nitin Bhide (nitinbhide@gmail.com)
+
+This module is part of SVNPlot (https://bitbucket.org/nitinbhide/svnplot) and is released under
+the New BSD License: http://www.opensource.org/licenses/bsd-license.php
+--------------------------------------------------------------------------------------
+
+This file implements the iterator over the revisions in a subversion dump file (created with
+'svnadmin dump' or 'svnrdump dump'). Converting a local dump avoids one repository query for
+every log block, path type, mime-type and diff. The dump is read sequentially once. Path types,
+copy information, properties and file contents (full texts or svndiff deltas) are taken from the
+dump itself. The revision logs are returned as SVNRevLog objects and hence are written to the
+database exactly like the logs queried from the repository.
+'''
+import six
+import logging
+import calendar
+import time
+import os
+import zlib
+import bisect
+import difflib
+import hashlib
+import sqlite3
+import tempfile
+from collections import namedtuple, OrderedDict
+from contextlib import closing
+
+from .svnlogiter import *
+
+# Node-action in the dump and the corresponding action in the svn log.
+DUMP_NODE_ACTIONS = {'change': 'M', 'add': 'A', 'delete': 'D', 'replace': 'R'}
+EMPTY_MD5 = hashlib.md5(b'').hexdigest()
+
+# file or directory in one revision. kind is 'F' or 'D', md5 is the checksum of file contents
+# and props is dictionary of node properties.
+DumpNode = namedtuple('DumpNode', 'kind md5 props')
+
+
+def dumpPath(path):
+    '''
+    convert the node path in the dump to the path used in the svn log (i.e. with leading '/')
+    '''
+    return('/' + path.strip('/'))
+
+
+def parseSvnDate(datestr):
+    '''
+    convert svn:date property value (e.g. 2009-01-30T10:20:30.123456Z) to seconds since epoch.
+    '''
+    datestr, sep, fraction = datestr.strip().rstrip('Z').partition('.')
+    secs = calendar.timegm(time.strptime(datestr, '%Y-%m-%dT%H:%M:%S'))
+    if(fraction != ''):
+        secs = secs + float('0.' + fraction)
+    return(secs)
+
+
+def parseProps(propdata, props=None):
+    '''
+    parse the property block of a dump record and return the dictionary of properties. If
+    props is given, then property block is a delta (i.e. 'Prop-delta: true') to these properties.
+    '''
+    props = dict(props or {})
+    propbuf = six.BytesIO(propdata)
+
+    def readValue(line):
+        length = int(line.split()[1])
+        value = propbuf.read(length)
+        propbuf.readline()
+        return(value)
+
+    while(True):
+        line = propbuf.readline()
+        if(line == b'' or line == b'PROPS-END\n'):
+            break
+        key = readValue(line).decode('utf-8')
+        if(line.startswith(b'K ')):
+            props[key] = readValue(propbuf.readline())
+        elif(line.startswith(b'D ')):
+            props.pop(key, None)
+        else:
+            raise ValueError("Invalid property block in dump : %r" % line)
+    return(props)
+
+
+def _readVarint(data, pos):
+    '''
+    read the variable length integer used in svndiff data. Returns value and next position.
+    '''
+    value = 0
+    while(True):
+        byte = six.indexbytes(data, pos)
+        pos = pos + 1
+        value = (value << 7) | (byte & 0x7f)
+        if(byte & 0x80 == 0):
+            break
+    return(value, pos)
+
+
+def _svndiffSection(data):
+    '''
+    svndiff1 sections are prefixed with the original length and are zlib compressed if that
+    reduces the size.
+    '''
+    origlen, pos = _readVarint(data, 0)
+    data = data[pos:]
+    if(len(data) != origlen):
+        data = zlib.decompress(data)
+    return(data)
+
+
+def _applyWindow(sview, instructions, newdata, tviewlen):
+    '''
+    apply the instructions of one svndiff window and return the target view.
+    '''
+    tview = bytearray()
+    pos = 0
+    newpos = 0
+    while(pos < len(instructions)):
+        byte = six.indexbytes(instructions, pos)
+        pos = pos + 1
+        op = byte >> 6
+        length = byte & 0x3f
+        if(length == 0):
+            length, pos = _readVarint(instructions, pos)
+        if(op == 2):
+            tview += newdata[newpos:newpos + length]
+            newpos = newpos + length
+            continue
+        offset, pos = _readVarint(instructions, pos)
+        if(op == 0):
+            tview += sview[offset:offset + length]
+        elif(op == 1):
+            # target copy may overlap the data being written. Copy in chunks of available data.
+            while(length > 0):
+                chunk = tview[offset:offset + length]
+                tview += chunk
+                offset = offset + len(chunk)
+                length = length - len(chunk)
+        else:
+            raise ValueError("Invalid svndiff instruction")
+    if(len(tview) != tviewlen):
+        raise ValueError("Invalid svndiff window. Target length mismatch")
+    return(bytes(tview))
+
+
+def applySvnDiff(source, delta):
+    '''
+    apply the svndiff (version 0 or 1) delta to the source contents and return the target contents.
+    '''
+    if(delta[:3] != b'SVN'):
+        raise ValueError("Invalid svndiff data in dump")
+    version = six.indexbytes(delta, 3)
+    if(version > 1):
+        raise ValueError("svndiff version %d is not supported. Create the dump without --deltas" % version)
+    target = []
+    pos = 4
+    while(pos < len(delta)):
+        sviewoffset, pos = _readVarint(delta, pos)
+        sviewlen, pos = _readVarint(delta, pos)
+        tviewlen, pos = _readVarint(delta, pos)
+        inslen, pos = _readVarint(delta, pos)
+        newlen, pos = _readVarint(delta, pos)
+        instructions = delta[pos:pos + inslen]
+        pos = pos + inslen
+        newdata = delta[pos:pos + newlen]
+        pos = pos + newlen
+        if(version == 1):
+            instructions = _svndiffSection(instructions)
+            newdata = _svndiffSection(newdata)
+        sview = source[sviewoffset:sviewoffset + sviewlen]
+        target.append(_applyWindow(sview, instructions, newdata, tviewlen))
+    return(b''.join(target))
+
+
+class SVNDumpReader(object):
+    '''
+    read the records (headers, property block and text block) of a dump file sequentially.
+    '''
+
+    def __init__(self, dumpfile, readNodes=True):
+        '''
+        dumpfile is a file object opened in binary mode. If readNodes is False, then node records
+        are skipped without reading their contents (e.g. to scan the revision dates).
+        '''
+        self.dumpfile = dumpfile
+        self.readNodes = readNodes
+
+    def __iter__(self):
+        return(self.next())
+
+    def __readHeaders(self):
+        headers = dict()
+        line = self.dumpfile.readline()
+        while(line == b'\n'):
+            line = self.dumpfile.readline()
+        while(line != b'' and line != b'\n'):
+            name, sep, value = line.rstrip(b'\n').partition(b': ')
+            if(sep == b''):
+                raise ValueError("Invalid header in dump : %r" % line)
+            headers[name.decode('utf-8')] = value.decode('utf-8')
+            line = self.dumpfile.readline()
+        return(headers)
+
+    def next(self):
+        while(True):
+            headers = self.__readHeaders()
+            if(len(headers) == 0):
+                break
+            proplen = int(headers.get('Prop-content-length', 0))
+            textlen = int(headers.get('Text-content-length', 0))
+            contentlen = int(headers.get('Content-length', proplen + textlen))
+            if('Node-path' in headers and self.readNodes == False):
+                self.dumpfile.seek(contentlen, os.SEEK_CUR)
+                continue
+            props = None
+            text = None
+            if(proplen > 0):
+                props = self.dumpfile.read(proplen)
+            if('Text-content-length' in headers):
+                text = self.dumpfile.read(textlen)
+            if(contentlen > proplen + textlen):
+                self.dumpfile.seek(contentlen - proplen - textlen, os.SEEK_CUR)
+            yield headers, props, text
+
+
+class DumpContentStore(object):
+    '''
+    file contents read from the dump with their md5 checksum as key. Contents are kept compressed
+    in a temporary sqlite database so that memory usage doesn't grow with the repository size.
+    '''
+
+    def __init__(self):
+        fd, self.dbpath = tempfile.mkstemp('.db', 'svnplotdump')
+        os.close(fd)
+        self.dbcon = sqlite3.connect(self.dbpath)
+        self.dbcon.execute("PRAGMA synchronous=OFF")
+        self.dbcon.execute("PRAGMA journal_mode=OFF")
+        self.dbcon.execute("CREATE TABLE DumpContent(md5 text PRIMARY KEY, data blob)")
+        self.linecounts = dict()
+        self.add(EMPTY_MD5, b'')
+
+    def add(self, md5, data):
+        self.dbcon.execute("INSERT OR IGNORE INTO DumpContent(md5, data) values(?,?)",
+                           (md5, sqlite3.Binary(zlib.compress(data))))
+
+    def get(self, md5):
+        with closing(self.dbcon.cursor()) as cur:
+            cur.execute("SELECT data FROM DumpContent WHERE md5=?", (md5,))
+            row = cur.fetchone()
+        if(row is None):
+            raise ValueError("Contents with md5 %s not found in dump" % md5)
+        return(zlib.decompress(bytes(row[0])))
+
+    def getLineCount(self, md5):
+        '''
+        line count of the contents. Same contents are typically counted many times (e.g. copies)
+        hence line counts are cached.
+        '''
+        linecount = self.linecounts.get(md5)
+        if(linecount is None):
+            data = self.get(md5)
+            linecount = data.count(b'\n')
+            if(len(data) > 0 and not data.endswith(b'\n')):
+                linecount = linecount + 1
+            self.linecounts[md5] = linecount
+        return(linecount)
+
+    def close(self):
+        self.dbcon.close()
+        os.unlink(self.dbpath)
+
+
+class DumpPathTree(object):
+    '''
+    history of the paths in the dump. Only the changed paths are stored. A directory copy is
+    stored as a link to the copy source and paths inside the copied directory are resolved
+    through this link. Hence copying a large directory (e.g. tags) is a single entry.
+    '''
+
+    def __init__(self):
+        # path -> ([revnos], [DumpNode or None]) of each change of the path itself
+        self.history = dict()
+        # dirpath -> ([revnos], [(copyfrompath, copyfromrev) or None]) of the revisions in which
+        # the directory contents were replaced (i.e. directory added, replaced or deleted)
+        self.subtree = dict()
+
+    def __entry(self, history, path, revno):
+        entry = None
+        revhist = history.get(path)
+        if(revhist is not None):
+            revnos, values = revhist
+            idx = bisect.bisect_right(revnos, revno)
+            if(idx > 0):
+                entry = (revnos[idx - 1], values[idx - 1])
+        return(entry)
+
+    def __set(self, history, path, revno, value):
+        revnos, values = history.setdefault(path, ([], []))
+        if(len(revnos) > 0 and revnos[-1] == revno):
+            values[-1] = value
+        else:
+            revnos.append(revno)
+            values.append(value)
+
+    def get(self, path, revno):
+        '''
+        return the DumpNode of the path in revision revno or None if the path doesn't exist.
+        '''
+        best = self.__entry(self.history, path, revno)
+        bestpath = path
+        dirpath = path
+        while(dirpath != '/'):
+            dirpath = dirpath.rsplit('/', 1)[0] or '/'
+            entry = self.__entry(self.subtree, dirpath, revno)
+            if(entry is not None and (best is None or entry[0] > best[0])):
+                best = entry
+                bestpath = dirpath
+
+        node = None
+        if(best is not None):
+            if(bestpath == path):
+                node = best[1]
+            elif(best[1] is not None):
+                copyfrompath, copyfromrev = best[1]
+                node = self.get(copyfrompath.rstrip('/') + path[len(bestpath):], copyfromrev)
+        return(node)
+
+    def set(self, path, revno, node):
+        self.__set(self.history, path, revno, node)
+
+    def setSubtree(self, path, revno, copyfrom):
+        '''
+        contents of the directory are replaced with the contents of copy source (or are removed if
+        copyfrom is None) in revision revno.
+        '''
+        self.__set(self.subtree, path, revno, copyfrom)
+
+    def delete(self, path, revno):
+        self.set(path, revno, None)
+        self.setSubtree(path, revno, None)
+
+
+class DumpLog(dict):
+    '''
+    revision log read from the dump. Provides the same attributes as the pysvn.PysvnLog
+    '''
+
+    def __getattr__(self, name):
+        try:
+            return(self[name])
+        except KeyError:
+            raise AttributeError(name)
+
+
+class SVNDumpClient(object):
+    '''
+    replacement of SVNLogClient which reads the revision logs, path types and file contents from
+    the dump file instead of the repository.
+    '''
+
+    def __init__(self, dumppath, binaryext=[], repopath='/'):
+        self.dumppath = dumppath
+        self.repopath = repopath
+        self.tree = DumpPathTree()
+        self.contents = None
+        self.pathhistory = None
+        self.pathkinds = None
+        self.mimetypes = None
+        self.diffstats = None
+        self.timers = StageTimers()
+        self.setbinextlist(binaryext)
+
+    def setbinextlist(self, binextlist):
+        self.binaryextlist = binaryExtList(binextlist)
+
+    def getRootUrl(self):
+        return(self.dumppath)
+
+    def getRepoPathPrefix(self):
+        return('')
+
+    def isChildPath(self, filepath):
+        return(filepath.startswith(self.repopath))
+
+    def isLoggedRevision(self, revlog):
+        '''
+        check if the revision changes the repository path (i.e. it is in the 'svn log' of the
+        repository path).
+        '''
+        repopath = self.repopath.rstrip('/')
+        logged = (repopath == '')
+        for change in revlog.changed_paths:
+            if(logged == True):
+                break
+            logged = (change['path'] == repopath or change['path'].startswith(repopath + '/'))
+        return(logged)
+
+    def printSvnErrorHint(self, exp):
+        '''
+        errors in the dump are not going to go away by retrying the conversion.
+        '''
+        print("Error in reading the dump file %s : %s" % (self.dumppath, exp))
+        return(True)
+
+    def getRevisionDates(self):
+        '''
+        return list of (revno, commit date) of revisions in the dump. Only the revision records are
+        read. Node contents are skipped.
+        '''
+        revdates = []
+        with open(self.dumppath, 'rb') as dumpfile:
+            for headers, props, text in SVNDumpReader(dumpfile, readNodes=False):
+                revno = int(headers.get('Revision-number', 0))
+                if(revno > 0):
+                    revprops = parseProps(props or b'')
+                    revdate = None
+                    if('svn:date' in revprops):
+                        revdate = parseSvnDate(revprops['svn:date'].decode('utf-8'))
+                    revdates.append((revno, revdate))
+        return(revdates)
+
+    def findStartEndRev(self, startdate=None, enddate=None):
+        revdates = [(revno, revdate) for revno, revdate in self.getRevisionDates()
+                    if revdate is not None]
+        startrevno = 1
+        endrevno = 0
+        if(len(revdates) > 0):
+            startrevno = revdates[-1][0] + 1
+            for revno, revdate in revdates:
+                if(startdate is None or revdate >= startdate):
+                    startrevno = revno
+                    break
+            for revno, revdate in revdates:
+                if(enddate is None or revdate <= enddate):
+                    endrevno = revno
+        return(startrevno, endrevno)
+
+    def getNode(self, filepath, revno):
+        return(self.tree.get(dumpPath(filepath), revno))
+
+    def isDirectory(self, revno, changepath):
+        node = self.getNode(changepath, revno)
+        return(node is not None and node.kind == 'D')
+
+    def cachePathType(self, filepath, revno, pathtype):
+        pass
+
+    def prefetchMimeTypes(self, pathrevlist):
+        pass
+
+    def isBinaryFile(self, filepath, revno):
+        binary = filepath.endswith(self.binaryextlist)
+        if(binary == False):
+            node = self.getNode(filepath, revno)
+            fmimetype = ''
+            if(node is not None):
+                fmimetype = node.props.get('svn:mime-type', b'').decode('utf-8')
+            if(fmimetype != '' and isTextMimeType(fmimetype) == False):
+                binary = True
+        return(binary)
+
+    def getLineCount(self, filepath, revno):
+        linecount = 0
+        if(self.isBinaryFile(filepath, revno) == False):
+            node = self.getNode(filepath, revno)
+            if(node is not None and node.kind == 'F' and 'svn:special' not in node.props):
+                with self.timers.measure('linecount'):
+                    linecount = self.contents.getLineCount(node.md5)
+        return(linecount)
+
+    def __getContentLines(self, filepath, revno):
+        lines = []
+        node = None
+        if(filepath is not None and revno is not None):
+            node = self.getNode(filepath, revno)
+        if(node is not None and node.kind == 'F'):
+            lines = self.contents.get(node.md5).splitlines(True)
+        return(lines)
+
+    def getRevFileDiff(self, path, revno, prev_path=None, prev_rev_no=None):
+        '''
+        the dump doesn't contain diffs. Create a diff in the same format as 'svn diff' (i.e.
+        Index line followed by added/deleted lines) from the file contents.
+        '''
+        if(prev_path is None):
+            prev_path = path
+        if(prev_rev_no is None):
+            prev_rev_no = revno - 1
+        with self.timers.measure('diff'):
+            oldlines = self.__getContentLines(prev_path, prev_rev_no)
+            newlines = self.__getContentLines(path, revno)
+            difflines = []
+            matcher = difflib.SequenceMatcher(None, oldlines, newlines)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if(tag != 'equal'):
+                    difflines.extend(b'-' + line.rstrip(b'\r\n') for line in oldlines[i1:i2])
+                    difflines.extend(b'+' + line.rstrip(b'\r\n') for line in newlines[j1:j2])
+        difftext = b''
+        if(len(difflines) > 0):
+            difflines.insert(0, b'Index: ' + path.strip('/').encode('utf-8'))
+            difftext = b'\n'.join(difflines) + b'\n'
+        return(difftext.decode('utf-8', 'replace'))
+
+    def __addChange(self, changes, path, action, copyfrom):
+        '''
+        one path may have multiple nodes in one revision. e.g. delete followed by add is a replace
+        and a modification of an added path is still an add.
+        '''
+        change = changes.get(path)
+        if(change is not None):
+            if(change['action'] == 'D' and action in ('A', 'R')):
+                action = 'R'
+            elif(change['action'] in ('A', 'R')):
+                action = change['action']
+            if(copyfrom is None and change['copyfrom_path'] is not None):
+                copyfrom = (change['copyfrom_path'], change['copyfrom_revision'].number)
+        copyfrompath = None
+        copyfromrev = None
+        if(copyfrom is not None):
+            copyfrompath = copyfrom[0]
+            copyfromrev = pysvn.Revision(pysvn.opt_revision_kind.number, copyfrom[1])
+        changes[path] = dict(path=path, action=action, copyfrom_path=copyfrompath,
+                             copyfrom_revision=copyfromrev)
+
+    def __applyNode(self, revno, headers, props, text, changes):
+        '''
+        update the path tree with one node record and add it to the changed paths of the revision.
+        '''
+        path = dumpPath(headers['Node-path'])
+        action = headers['Node-action']
+        if(action in ('delete', 'replace')):
+            self.tree.delete(path, revno)
+        copyfrom = None
+        if(action != 'delete'):
+            node = None
+            if('Node-copyfrom-path' in headers):
+                copyfrom = (dumpPath(headers['Node-copyfrom-path']), int(headers['Node-copyfrom-rev']))
+                node = self.tree.get(copyfrom[0], copyfrom[1])
+                if(node is None):
+                    logging.warning("Copy source %s@%d of %s not found in dump" % (copyfrom[0], copyfrom[1], path))
+            elif(action == 'change'):
+                node = self.tree.get(path, revno)
+
+            kind = headers.get('Node-kind')
+            if(kind is None and node is not None):
+                kind = 'file' if node.kind == 'F' else 'dir'
+            nodeprops = dict()
+            if(node is not None):
+                nodeprops = node.props
+            if(props is not None):
+                if(headers.get('Prop-delta') == 'true'):
+                    nodeprops = parseProps(props, nodeprops)
+                else:
+                    nodeprops = parseProps(props)
+
+            if(kind == 'dir'):
+                node = DumpNode('D', None, nodeprops)
+                if(action != 'change'):
+                    self.tree.setSubtree(path, revno, copyfrom)
+            else:
+                md5 = EMPTY_MD5
+                if(node is not None and node.kind == 'F'):
+                    md5 = node.md5
+                if(text is not None):
+                    if(headers.get('Text-delta') == 'true'):
+                        basemd5 = headers.get('Text-delta-base-md5', md5)
+                        text = applySvnDiff(self.contents.get(basemd5), text)
+                    md5 = headers.get('Text-content-md5') or hashlib.md5(text).hexdigest()
+                    self.contents.add(md5, text)
+                node = DumpNode('F', md5, nodeprops)
+            self.tree.set(path, revno, node)
+        self.__addChange(changes, path, DUMP_NODE_ACTIONS[action], copyfrom)
+
+    def readRevisions(self):
+        '''
+        read the dump and return the revision logs (DumpLog objects) in revision order. The path
+        tree is updated with the revision changes before its log is returned.
+        '''
+        self.contents = DumpContentStore()
+        try:
+            with open(self.dumppath, 'rb') as dumpfile:
+                revlog = None
+                changes = None
+                starttime = time.time()
+                for headers, props, text in SVNDumpReader(dumpfile):
+                    if('Revision-number' in headers):
+                        if(revlog is not None):
+                            revlog['changed_paths'] = list(changes.values())
+                            self.timers.add('log', time.time() - starttime)
+                            yield revlog
+                            starttime = time.time()
+                        revlog = self.__makeRevLog(int(headers['Revision-number']), props)
+                        changes = OrderedDict()
+                    elif('Node-path' in headers):
+                        self.__applyNode(revlog.revision.number, headers, props, text, changes)
+                if(revlog is not None):
+                    revlog['changed_paths'] = list(changes.values())
+                    self.timers.add('log', time.time() - starttime)
+                    yield revlog
+        finally:
+            self.contents.close()
+            self.contents = None
+
+    def __makeRevLog(self, revno, props):
+        revprops = parseProps(props or b'')
+        revlog = DumpLog(revision=pysvn.Revision(pysvn.opt_revision_kind.number, revno),
+                         message=revprops.get('svn:log', b'').decode('utf-8', 'replace'))
+        if('svn:author' in revprops):
+            revlog['author'] = revprops['svn:author'].decode('utf-8', 'replace')
+        if('svn:date' in revprops):
+            revlog['date'] = parseSvnDate(revprops['svn:date'].decode('utf-8'))
+        return(revlog)
+
+
+class SVNDumpRevLogIter(object):
+    '''
+    iterate over the revision logs (SVNRevLog objects) from startRevNo to endRevNo in the dump.
+    The dump is always read from the beginning since the earlier revisions are required to
+    know the contents of the changed paths.
+    '''
+
+    def __init__(self, dumpclient, startRevNo, endRevNo):
+        self.dumpclient = dumpclient
+        self.startrev = startRevNo
+        self.endrev = endRevNo
+
+    def __iter__(self):
+        return(self.next())
+
+    def next(self):
+        with closing(self.dumpclient.readRevisions()) as revlogs:
+            for revlog in revlogs:
+                revno = revlog.revision.number
+                if(revno > self.endrev):
+                    break
+                if(revno >= self.startrev and self.dumpclient.isLoggedRevision(revlog)):
+                    yield SVNRevLog(self.dumpclient, revlog, True)
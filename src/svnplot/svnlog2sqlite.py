@@ -15,18 +15,30 @@ generated by StatSVN/StatCVS.
 
 import datetime
 import calendar
+import time
 import sys
 import os
+import select
+import socket
 import logging
 import traceback
+import sqlite3
+import json
+from contextlib import closing
 
 import six
 
 from . import svnlogiter
+from . import svnlogcache
+from . import svndumpiter
 from .svnlogclient import makeunicode
+from .util import StageTimers
 from .configoptparse import ConfigOptionParser
 from .svnlogdb import SVNLogDB
 
+# progress of the conversion is printed at least every these many seconds.
+PROGRESS_SECONDS = 30
+
 BINARYFILEXT = ['doc', 'xls', 'ppt', 'docx', 'xlsx', 'pptx', 'dot', 'dotx', 'ods', 'odm', 'odt', 'ott', 'pdf',
                 'o', 'a', 'obj', 'lib', 'dll', 'so', 'exe',
                 'jar', 'zip', 'z', 'gz', 'tar', 'rar', '7z',
@@ -41,13 +53,36 @@ class SVNLog2Sqlite:
     def __init__(self, svnrepopath, sqlitedbpath, verbose=False, **kwargs):
         username = kwargs.pop('username', None)
         password = kwargs.pop('password', None)
+        maxcatsize = kwargs.pop('maxcatsize', None)
         logging.info("Repo url : " + svnrepopath)
-        self.svnclient = svnlogiter.SVNLogClient(
-            svnrepopath, BINARYFILEXT, username=username, password=password)
+        # dump file created with 'svnadmin dump' or 'svnrdump dump'. If given, the revisions are
+        # read from the dump and svnrepopath is the repository path inside the dump.
+        self.dumpfile = kwargs.pop('dumpfile', None)
+        if(self.dumpfile != None):
+            self.svnclient = svndumpiter.SVNDumpClient(self.dumpfile, BINARYFILEXT, svnrepopath)
+        else:
+            self.svnclient = svnlogiter.SVNLogClient(
+                svnrepopath, BINARYFILEXT, username=username, password=password)
+            if(maxcatsize != None):
+                self.svnclient.maxcatsize = maxcatsize
         self.db = SVNLogDB(dbpath=sqlitedbpath)
         self.verbose = verbose
         self.commit_after_numrev = kwargs.pop('commit_after_numrev', 10)
         self.filediff = kwargs.pop('filediff', False)
+        self.numworkers = kwargs.pop('numworkers', 1)
+        if(self.dumpfile != None):
+            # dump is read sequentially. Worker threads will not speed it up.
+            self.numworkers = 1
+        self.db.writebatchsize = max(1, kwargs.pop('writebatchsize', self.db.writebatchsize))
+        self.bulkload = kwargs.pop('bulkload', False)
+        # (startrevno, endrevno) of the revision range converted as a shard. Dummy entries for
+        # copied/deleted directories need the earlier history, hence they are added when the
+        # shards are merged.
+        self.shard = kwargs.pop('shard', None)
+        # last revision checked for new commits in watch mode.
+        self.lastcheckedrev = 0
+        # summary (time spent in each stage etc) of the last ConvertRevs call.
+        self.convstats = None
         if self.commit_after_numrev < 1:
             self.commit_after_numrev = 1
 
@@ -55,36 +90,139 @@ class SVNLog2Sqlite:
         # First check if this a full conversion or a partial conversion
         self.db.connect()
         self.CreateTables()
-        for trycount in range(0, maxtrycount):
-            try:
-                laststoredrev = self.getLastStoredRev()
-                rootUrl = self.svnclient.getRootUrl()
-                self.printVerbose("Root url found : %s" % rootUrl)
-                (startrevno, endrevno) = self.svnclient.findStartEndRev(
-                    svnrevstartdate, svnrevenddate)
-                startrevno = max(startrevno, laststoredrev + 1)
-                if startrevno <= endrevno:
-                    self.printVerbose(
-                        "Repository Start-End Rev no : %d-%d" % (startrevno, endrevno))
-                    self.ConvertRevs(startrevno, endrevno, bUpdLineCount)
-                    # every thing is ok. Commit the changes.
-                    self.db.commit()
-            except Exception as expinst:
-                logging.exception("Found Error")
-                self.svnexception_handler(expinst)
-                print("Trying again (%d)" % (trycount + 1))
-
-        self.closedb()
+        bulkload = self.bulkload
+        if(bulkload == True and self.getLastStoredRev() > 0):
+            # rebuilding the indexes of the existing data is slower than updating them.
+            print("Database already has revisions. Ignoring bulk load option")
+            bulkload = False
+        if(bulkload == True):
+            keepindexes = []
+            if(bUpdLineCount == True):
+                # dummy entries for copied/deleted directories query the files in a directory
+                # by path and their line counts by path id
+                keepindexes.extend(['svnlogdtlchangepathidx', 'svnpathidx'])
+            self.db.beginBulkLoad(keepindexes)
+        try:
+            for trycount in range(0, maxtrycount):
+                try:
+                    self.removeIncompleteRevs()
+                    laststoredrev = self.getLastStoredRev()
+                    rootUrl = self.svnclient.getRootUrl()
+                    self.printVerbose("Root url found : %s" % rootUrl)
+                    (startrevno, endrevno) = self.svnclient.findStartEndRev(
+                        svnrevstartdate, svnrevenddate)
+                    if(self.shard != None):
+                        startrevno = max(startrevno, self.shard[0])
+                        endrevno = min(endrevno, self.shard[1])
+                    startrevno = max(startrevno, laststoredrev + 1)
+                    if startrevno <= endrevno:
+                        self.printVerbose(
+                            "Repository Start-End Rev no : %d-%d" % (startrevno, endrevno))
+                        self.ConvertRevs(startrevno, endrevno, bUpdLineCount)
+                        # every thing is ok. Commit the changes.
+                        self.db.commit()
+                except Exception as expinst:
+                    logging.exception("Found Error")
+                    self.svnexception_handler(expinst)
+                    print("Trying again (%d)" % (trycount + 1))
+        finally:
+            # svnexception_handler may exit or the conversion may be interrupted (Ctrl+C). The
+            # database must not be left without the indexes and with the bulk load settings.
+            if(bulkload == True):
+                self.printVerbose("Creating indexes")
+                self.db.endBulkLoad()
+            self.closedb()
 
     def closedb(self):
         self.db.close()
 
+    def watch(self, bUpdLineCount=True, interval=60, notifyport=None):
+        '''
+        keep the database updated with the new revisions. The head revision of the repository is
+        checked every 'interval' seconds. If notifyport is given, then the head revision is also
+        checked as soon as a UDP datagram is received on this localhost port (e.g. sent by
+        the post-commit hook). The svn client and the database connection are kept open between
+        the updates. Press Ctrl+C to stop.
+        '''
+        # first catch up with the repository.
+        self.convert(None, None, bUpdLineCount)
+        listener = None
+        if(notifyport != None):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            listener.bind(('127.0.0.1', notifyport))
+        self.db.connect()
+        print("Watching the repository for new revisions. Press Ctrl+C to stop")
+        try:
+            while(True):
+                self.waitForCommit(listener, interval)
+                try:
+                    self.convertNewRevs(bUpdLineCount)
+                except Exception as expinst:
+                    logging.exception("Found Error")
+                    self.svnexception_handler(expinst)
+        except KeyboardInterrupt:
+            print("Stopped watching the repository")
+        finally:
+            if(listener != None):
+                listener.close()
+            self.closedb()
+
+    def waitForCommit(self, listener, interval):
+        '''
+        wait for the commit notification on the listener socket or till the interval is over.
+        '''
+        if(listener == None):
+            time.sleep(interval)
+        else:
+            readable, writable, errors = select.select([listener], [], [], interval)
+            # commits in quick succession need only one update. Read all pending notifications.
+            while(len(readable) > 0):
+                listener.recv(1024)
+                readable, writable, errors = select.select([listener], [], [], 0)
+
+    def convertNewRevs(self, bUpdLineCount):
+        '''
+        convert the revisions committed after the last stored (or checked) revision.
+        '''
+        self.removeIncompleteRevs()
+        startrevno = max(self.getLastStoredRev(), self.lastcheckedrev) + 1
+        endrevno = self.svnclient.getHeadRevNo()
+        if(startrevno <= endrevno):
+            self.ConvertRevs(startrevno, endrevno, bUpdLineCount)
+            self.db.commit()
+            self.lastcheckedrev = endrevno
+
+    def removeIncompleteRevs(self):
+        '''
+        remove the partially converted revisions (and revisions after them) recorded in the
+        revision journal, so that conversion resumes from the first incomplete revision.
+        '''
+        firstrev = self.db.getFirstIncompleteRev()
+        if(firstrev != None):
+            self.printVerbose("Revision %d is not converted completely. Resuming from it" % firstrev)
+            self.db.removeRevisions(firstrev)
+            self.db.commit()
+
+    def saveCompletedRevs(self):
+        '''
+        commit the revisions converted so far and remove the partially converted revision
+        so that they are not fetched again on retry. If the database changes cannot be
+        committed, roll back to the last commit.
+        '''
+        try:
+            self.db.commit()
+            self.removeIncompleteRevs()
+            print("Found Error. Saved the completed revisions (upto %d)" % self.getLastStoredRev())
+        except Exception:
+            logging.exception("Error in saving the completed revisions")
+            self.db.rollback()
+            print("Found Error. Rolled back recent changes")
+
     def svnexception_handler(self, expinst):
         '''
         decide to continue or exit on the svn exception.
         '''
-        self.db.rollback()
-        print("Found Error. Rolled back recent changes")
+        self.saveCompletedRevs()
         # print "Error type %s" % type(expinst)
         if(isinstance(expinst, AssertionError)):
             exit(1)
@@ -102,7 +240,24 @@ class SVNLog2Sqlite:
         '''
         update the filepath id if required.
         '''
-        return self.db.getFilePathId()
+        return self.db.getFilePathId(filepath)
+
+    def getRevLogIter(self, startrev, endrev, bUpdLineCount, revfilter=None):
+        '''
+        return the iterator over the revision logs from startrev to endrev.
+        '''
+        if(self.dumpfile != None):
+            svnloglist = svndumpiter.SVNDumpRevLogIter(self.svnclient, startrev, endrev)
+        else:
+            svnloglist = svnlogiter.SVNRevLogIter(
+                self.svnclient, startrev, endrev, bUseFileDiff=self.filediff)
+            if(self.numworkers > 1):
+                # query the repository for multiple revisions in parallel. Revisions are still
+                # returned in order and written to database in this thread.
+                self.printVerbose("Using %d worker threads" % self.numworkers)
+                svnloglist = svnlogiter.SVNRevLogParallelIter(
+                    svnloglist, self.numworkers, bUpdLineCount, revfilter=revfilter)
+        return(svnloglist)
 
     def ConvertRevs(self, startrev, endrev, bUpdLineCount):
         self.printVerbose("Converting revisions %d to %d" % (startrev, endrev))
@@ -110,14 +265,17 @@ class SVNLog2Sqlite:
             self.printVerbose("Conversion started")
             logging.info("Updating revision from %d to %d" %
                          (startrev, endrev))
-            svnloglist = svnlogiter.SVNRevLogIter(
-                self.svnclient, startrev, endrev, bUseFileDiff=self.filediff)
+            self.initPathCache(startrev)
+            svnloglist = self.getRevLogIter(startrev, endrev, bUpdLineCount)
             revcount = 0
             lc_updated = 'N'
             if(bUpdLineCount == True):
                 lc_updated = 'Y'
             lastrevno = 0
-            bAddDummy = True
+            # dummy entries of a shard are added when the shards are merged.
+            bAddDummy = (self.shard == None)
+            timers = self.svnclient.timers
+            lastprogress = time.time()
 
             for revlog in svnloglist:
                 logging.debug("Revision author:%s" % revlog.author)
@@ -129,37 +287,108 @@ class SVNLog2Sqlite:
                 if(revlog.isvalid() == True):
                     logging.debug("Adding revision %s files (%d, %d, %d)" % (
                         revlog.revno, addedfiles, changedfiles, deletedfiles))
-                    self.db.addRevision(
-                        revlog, addedfiles, changedfiles, deletedfiles)
+                    with timers.measure('dbinsert'):
+                        self.db.addRevision(
+                            revlog, addedfiles, changedfiles, deletedfiles)
+                        self.db.setRevisionState(revlog.revno, 'L')
 
                     for change in revlog.getDiffLineCount(bUpdLineCount):
-                        self.db.addRevisionDetails(
-                            revlog.revno, change, lc_updated)
+                        with timers.measure('dbinsert'):
+                            self.db.addRevisionDetails(
+                                revlog.revno, change, lc_updated)
+                    if(revlog.diffstrategy != None):
+                        self.db.setDiffStrategy(revlog.revno, *revlog.diffstrategy)
+                    self.db.setRevisionState(revlog.revno, 'P')
 
                     if(bUpdLineCount == True and bAddDummy == True):
                         # dummy entries may add additional added/deleted file
                         # entries.
-                        (addedfiles1, deletedfiles1) = self.addDummyLogDetail(
-                            revlog)
-                        addedfiles = addedfiles + addedfiles1
-                        deletedfiles = deletedfiles + deletedfiles1
-                        self.db.updateNumFiles(
-                            revlog.revno, addedfiles, deletedfiles)
+                        with timers.measure('dummy'):
+                            (addedfiles1, deletedfiles1) = self.addDummyLogDetail(
+                                revlog)
+                            addedfiles = addedfiles + addedfiles1
+                            deletedfiles = deletedfiles + deletedfiles1
+                            self.db.updateNumFiles(
+                                revlog.revno, addedfiles, deletedfiles)
+                        self.db.setRevisionState(revlog.revno, 'D')
 
                         # print "%d : %s : %s : %d : %d " % (revlog.revno,
                         # filename, changetype, linesadded, linesdeleted)
+                    self.db.addPathKinds(self.svnclient.pathkinds.popNewEntries())
+                    self.db.setRevisionState(revlog.revno, 'C')
                     lastrevno = revlog.revno
                     # commit after every 10 revisions or number revisions is
                     # less than 10, commit after every revision
                     if(revcount % self.commit_after_numrev == 0):
-                        self.db.commit()
-                        self.printVerbose(
-                            "Number revisions converted : %d (Rev no : %d)" % (revcount, lastrevno))
+                        with timers.measure('commit'):
+                            self.db.commit()
+                        if(self.verbose == True or time.time() - lastprogress >= PROGRESS_SECONDS):
+                            self.printProgress(timers, revcount, startrev, lastrevno, endrev)
+                            lastprogress = time.time()
                 logging.debug(
                     "Number revisions converted : %d (Rev no : %d)" % (revcount, lastrevno))
 
+            self.db.addPathKinds(self.svnclient.pathkinds.popNewEntries())
             if(self.verbose == False):
                 print("Number revisions converted : %d (Rev no : %d)" % (revcount, lastrevno))
+            self.convstats = self.getConversionSummary(timers, revcount, startrev, lastrevno)
+            self.printVerbose("Conversion summary : %s" % json.dumps(self.convstats, sort_keys=True))
+
+    def printProgress(self, timers, revcount, startrev, lastrevno, endrev):
+        '''
+        print the number of revisions converted with the conversion rate and the estimated
+        time to convert the remaining revisions.
+        '''
+        elapsed = timers.elapsed()
+        msg = "Number revisions converted : %d (Rev no : %d)" % (revcount, lastrevno)
+        if(elapsed > 0 and lastrevno >= startrev):
+            # revision numbers (instead of revision count) are used for the time estimate, since
+            # all the revisions may not change the repository path.
+            eta = (endrev - lastrevno) * elapsed / (lastrevno - startrev + 1)
+            msg = msg + " %.1f rev/s, ETA %s" % (revcount / elapsed,
+                                                  datetime.timedelta(seconds=int(eta)))
+        logging.info(msg)
+        print(msg)
+
+    def getConversionSummary(self, timers, revcount, startrev, lastrevno):
+        '''
+        return the dictionary with number of revisions converted, time and number of calls of each
+        conversion stage and cache statistics. Stage times include the time in the worker threads
+        and hence can add up to more than the elapsed time. Database writes are buffered and hence
+        mostly included in 'commit' time.
+        '''
+        elapsed = timers.elapsed()
+        summary = dict()
+        summary['revisions'] = revcount
+        summary['startrev'] = startrev
+        summary['lastrev'] = lastrevno
+        summary['seconds'] = round(elapsed, 3)
+        summary['revspersec'] = round(revcount / elapsed, 2) if elapsed > 0 else 0
+        summary['stages'] = timers.summary()
+        summary['pathtypecache'] = {'hits': self.svnclient.pathkinds.hits,
+                                    'misses': self.svnclient.pathkinds.misses}
+        summary['linecountcache'] = {'hits': self.svnclient.linecounts.hits,
+                                     'misses': self.svnclient.linecounts.misses}
+        summary['diffstrategies'] = dict(self.svnclient.diffstats.counts)
+        return(summary)
+
+    def initPathCache(self, startrev):
+        '''
+        create the path history, path type, mime-type, line count caches and diff strategy statistics shared by all
+        the log clients.
+        Path types stored in the database are reused only if the conversion continues from the
+        last stored revision. Otherwise deletions in the skipped revisions are not known.
+        '''
+        pathhistory = svnlogcache.PathHistory(startrev)
+        pathkinds = svnlogcache.PathKindCache(pathhistory)
+        if(startrev == self.getLastStoredRev() + 1):
+            pathkinds.load(self.db.getPathKinds())
+        self.svnclient.pathhistory = pathhistory
+        self.svnclient.pathkinds = pathkinds
+        self.svnclient.mimetypes = svnlogcache.MimeTypeCache(pathhistory)
+        self.svnclient.diffstats = svnlogcache.DiffStrategyStats()
+        self.svnclient.linecounts = svnlogcache.LineCountCache(pathhistory)
+        self.svnclient.timers = StageTimers()
 
     def __createRevFileListForDir(self, revno, dirname):
         '''
@@ -171,63 +400,225 @@ class SVNLog2Sqlite:
         '''
         add dummy log detail entries for getting the correct line count data in case of tagging/branching and deleting the directories.
         '''
-        addedfiles = 0
-        deletedfiles = 0
+        copied_dirlist = [(change.filepath_unicode(),) + change.copyfrom()
+                          for change in revlog.getCopiedDirs()]
+        deleted_dirlist = [change.filepath() for change in revlog.getDeletedDirs()]
+        filepaths = [change.filepath() for change in revlog.getFileChangeEntries()]
 
-        copied_dirlist = revlog.getCopiedDirs()
-        deleted_dirlist = revlog.getDeletedDirs()
-
-        if(len(copied_dirlist) > 0 or len(deleted_dirlist) > 0):
-            # since we may have to query the existing data. Commit the changes
-            # first.
-            self.db.commit()
-            # Now create list of file names for adding dummy entries. There is
-            # no  need to add dummy entries for directories.
-            if(len(copied_dirlist) > 0):
-                # now update the additions
-                # Path type is directory then dummy entries are required.
-                # For file type, 'real' entries will get creaetd
-                logging.debug("Adding dummy file addition entries")
-                deleted_dirlist = self.db.createRevFileList(
-                    revlog, copied_dirlist, deleted_dirlist)
-                addedfiles = self.db.addDummyAdditionDetails(revlog.revno)
-            if len(deleted_dirlist) > 0:
-                logging.debug("Adding dummy file deletion entries")
-                for deleted_dir in deleted_dirlist:
-                    deletedfiles = deletedfiles + \
-                        self.db.addDummyDeletionDetails(
-                            revlog.revno, deleted_dir.filepath())
-
-        return(addedfiles, deletedfiles)
+        return(self.db.addDummyEntries(revlog.revno, filepaths, copied_dirlist, deleted_dirlist))
 
     def UpdateLineCountData(self):
-        self.initdb()
+        '''
+        update the line counts of the revisions converted without line count (i.e. lc_updated
+        is 'N'). Completed revisions are committed after every 'commit_after_numrev' revisions
+        and the update can be resumed if it is interrupted.
+        '''
+        self.db.connect()
         try:
             self.__updateLineCountData()
         except Exception as expinst:
             logging.exception("Error %s" % expinst)
             print("Error %s" % expinst)
+            # revisions which are not updated completely are updated again on the next run.
+            self.db.commit()
+            print("Line count update is incomplete. Run again to resume it")
         self.closedb()
 
     def __updateLineCountData(self):
         '''Update the line count data in SVNLogDetail where lc_update flag is 'N'.
         This function is to be used with incremental update of only 'line count' data.
+        Dummy entries and file tables are generated again for all the revisions from the first
+        revision without line count, as they depend on the line counts of earlier revisions.
         '''
-        # first create temporary table from SVNLogDetail where only the lc_updated status is 'N'
-        # Set the autocommit on so that update cursor inside the another cursor
-        # loop works.
+        fromrevno = self.db.prepareLineCountUpdate()
+        if(fromrevno == None):
+            print("Line count data of all the revisions is already updated")
+            return
+        lcrevs = self.db.getRevsLineCountNotUpdated()
+        lcrevset = set(lcrevs)
+        lastrevno = self.getLastStoredRev()
+        self.printVerbose("Updating line count of %d revisions (revisions %d to %d)" % (
+            len(lcrevs), fromrevno, lastrevno))
+        revlogs = iter([])
+        if(len(lcrevs) > 0):
+            self.svnclient.getRootUrl()
+            self.initPathCache(lcrevs[0])
+            svnloglist = self.getRevLogIter(
+                lcrevs[0], lcrevs[-1], True, revfilter=lcrevset.__contains__)
+            revlogs = iter(svnloglist)
+        revlog = None
+        revcount = 0
+
+        while(fromrevno <= lastrevno):
+            torevno = fromrevno + self.commit_after_numrev - 1
+            for logrow, details in list(self.db.getRevisionEntries(fromrevno, torevno)):
+                revno = logrow[0]
+                if(revno in lcrevset):
+                    while(revlog == None or revlog.revno < revno):
+                        revlog = next(revlogs, None)
+                        if(revlog == None):
+                            break
+                    if(revlog != None and revlog.revno == revno):
+                        self.__updateRevLineCount(revlog)
+                    else:
+                        logging.warning("Revision log of %d not found" % revno)
+                self.db.updateFileTables(revno)
+                self.__addDummyEntries(logrow, details)
+                self.db.setRevisionState(revno, 'C')
+                revcount = revcount + 1
+            self.db.commit()
+            self.printVerbose("Line count updated upto revision %d (%d of %d revisions)" % (
+                min(torevno, lastrevno), revcount, len(lcrevs)))
+            fromrevno = torevno + 1
 
-        for revno, changedpath, changetype in self.getRevsLineCountNotUpdated():
-            linesadded = 0
-            linesdeleted = 0
-            self.printVerbose(
-                "getting diff count for %d:%s" % (revno, changedpath))
+    def __updateRevLineCount(self, revlog):
+        '''
+        update the line counts of the log detail entries of the revision from the repository.
+        '''
+        linecounts = [(change.lc_added(), change.lc_deleted(), self.getFilePathId(change.filepath_unicode()))
+                      for change in revlog.getDiffLineCount(True)]
+        self.db.updateLineCounts(revlog.revno, linecounts)
+        if(revlog.diffstrategy != None):
+            self.db.setDiffStrategy(revlog.revno, *revlog.diffstrategy)
 
-            linesadded, linesdeleted = self.svnclient.getDiffLineCountForPath(
-                revno, changedpath, changetype)
-            self.updateLineCount(revno, changedpath, linesadded, linesdeleted)
+    def __addDummyEntries(self, logrow, details):
+        '''
+        add the dummy entries of the revision from its stored log detail rows and update the
+        added/deleted file count.
+        '''
+        revno = logrow[0]
+        filepaths, copied_dirlist, deleted_dirlist = getDirChanges(details)
+        addedfiles1, deletedfiles1 = self.db.addDummyEntries(
+            revno, filepaths, copied_dirlist, deleted_dirlist)
+        addedfiles = len([dtl for dtl in details if dtl[4] == 'F' and dtl[1] == 'A'])
+        deletedfiles = len([dtl for dtl in details if dtl[4] == 'F' and dtl[1] == 'D'])
+        self.db.updateNumFiles(revno, addedfiles + addedfiles1, deletedfiles + deletedfiles1)
 
-        self.db.commit()
+    def printVerbose(self, msg):
+        logging.info(msg)
+        if(self.verbose == True):
+            print(msg)
+
+
+class SVNShardMerge(object):
+
+    '''
+    merge the databases of the revision ranges converted separately (using --shard option) into
+    one database. Path ids are assigned again in the merged database and the dummy entries for
+    copied/deleted directories (which need the earlier history) are added during the merge.
+    Merged revisions are recorded in the revision journal, hence an interrupted merge is resumed
+    by running it again with the same shards.
+    '''
+
+    def __init__(self, sqlitedbpath, verbose=False, commit_after_numrev=10):
+        self.db = SVNLogDB(dbpath=sqlitedbpath)
+        self.verbose = verbose
+        self.commit_after_numrev = max(1, commit_after_numrev)
+
+    def merge(self, shardpaths):
+        self.db.connect()
+        try:
+            shards = self.__sortShards(shardpaths)
+            # remove the revision partially merged by the earlier (interrupted) merge.
+            firstincomplete = self.db.getFirstIncompleteRev()
+            if(firstincomplete != None):
+                self.printVerbose("Revision %d is not merged completely. Resuming from it" % firstincomplete)
+                self.db.removeRevisions(firstincomplete)
+                self.db.commit()
+            laststoredrev = self.db.getLastStoredRev()
+            self.__checkShardRanges(shards, laststoredrev)
+            for firstrev, lastrev, shardpath in shards:
+                if(lastrev <= laststoredrev):
+                    self.printVerbose("Shard %s (revisions %d-%d) is already merged" % (shardpath, firstrev, lastrev))
+                    continue
+                self.printVerbose("Merging %s (revisions %d-%d)" % (shardpath, firstrev, lastrev))
+                fromrevno = max(firstrev, laststoredrev + 1)
+                # path types of a partially merged shard are already added by the earlier merge.
+                self.mergeShard(shardpath, fromrevno, addpathkinds=(fromrevno == firstrev))
+        except:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.close()
+
+    def __checkShardRanges(self, shards, laststoredrev):
+        '''
+        check that the shards (sorted on revisions) continue the revisions stored in the database
+        without any gaps or overlaps. Revisions of the shards which are already stored (i.e. merged
+        by an earlier run) are skipped during the merge.
+        '''
+        if(len(shards) == 0):
+            return
+        if(laststoredrev > 0 and shards[0][0] > laststoredrev + 1):
+            raise ValueError("Revisions %d-%d are missing. Database has revisions upto %d and shard %s starts at %d" % (
+                laststoredrev + 1, shards[0][0] - 1, laststoredrev, shards[0][2], shards[0][0]))
+        for (firstrev1, lastrev1, shardpath1), (firstrev2, lastrev2, shardpath2) in zip(shards, shards[1:]):
+            if(firstrev2 <= lastrev1):
+                raise ValueError("Shard %s (revisions %d-%d) overlaps with shard %s (revisions %d-%d)" % (
+                    shardpath2, firstrev2, lastrev2, shardpath1, firstrev1, lastrev1))
+            if(firstrev2 > lastrev1 + 1):
+                raise ValueError("Revisions %d-%d are missing between shards %s and %s" % (
+                    lastrev1 + 1, firstrev2 - 1, shardpath1, shardpath2))
+
+    def __sortShards(self, shardpaths):
+        '''
+        return list of (firstrev, lastrev, shardpath) sorted on the revisions. Empty shards are ignored.
+        '''
+        shards = []
+        for shardpath in shardpaths:
+            if(not os.path.exists(shardpath)):
+                raise ValueError("Shard database %s not found" % shardpath)
+            with closing(sqlite3.connect(shardpath)) as shardcon:
+                firstrev, lastrev = shardcon.execute("SELECT min(revno), max(revno) FROM SVNLog").fetchone()
+            if(firstrev == None):
+                print("Shard %s has no revisions. Ignoring it" % shardpath)
+                continue
+            shards.append((firstrev, lastrev, shardpath))
+        shards.sort()
+        return(shards)
+
+    def mergeShard(self, shardpath, fromrevno=0, addpathkinds=True):
+        '''
+        merge the revisions 'fromrevno' onwards of the shard database.
+        '''
+        sharddb = SVNLogDB(dbpath=shardpath)
+        sharddb.connect()
+        try:
+            if(addpathkinds == True):
+                self.db.addPathKinds(sharddb.getPathKinds(validonly=False))
+            for revno, strategy, mapped, fallback in sharddb.getDiffStrategies(fromrevno):
+                self.db.setDiffStrategy(revno, strategy, mapped, fallback)
+            revcount = 0
+            for logrow, details in sharddb.getRevisionEntries(fromrevno):
+                self.addRevision(logrow, details)
+                revcount = revcount + 1
+                if(revcount % self.commit_after_numrev == 0):
+                    self.db.commit()
+            self.db.commit()
+            self.printVerbose("Number revisions merged : %d" % revcount)
+        finally:
+            sharddb.close()
+
+    def addRevision(self, logrow, details):
+        revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles = logrow
+        self.db.addRevisionRow(revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles)
+        self.db.setRevisionState(revno, 'L')
+        lc_updated = 'Y'
+        for changedpath, changetype, copyfrompath, copyfromrev, pathtype, linesadded, linesdeleted, lc in details:
+            self.db.addRevisionDetailRow(revno, changedpath, changetype, copyfrompath, copyfromrev, pathtype,
+                                         linesadded, linesdeleted, lc)
+            if(lc != 'Y'):
+                lc_updated = lc
+        self.db.setRevisionState(revno, 'P')
+        filepaths, copied_dirlist, deleted_dirlist = getDirChanges(details)
+
+        # dummy entries are added only if the line count is extracted.
+        if(lc_updated == 'Y' and len(details) > 0):
+            addedfiles1, deletedfiles1 = self.db.addDummyEntries(
+                revno, filepaths, copied_dirlist, deleted_dirlist)
+            self.db.updateNumFiles(revno, addedfiles + addedfiles1, deletedfiles + deletedfiles1)
+            self.db.setRevisionState(revno, 'D')
+        self.db.setRevisionState(revno, 'C')
 
     def printVerbose(self, msg):
         logging.info(msg)
@@ -235,6 +626,36 @@ class SVNLog2Sqlite:
             print(msg)
 
 
+def getDirChanges(details):
+    '''
+    return the changed file paths, copied directories (path, copyfrompath, copyfromrev) and
+    deleted directories from the 'real' log detail rows of a revision (see
+    SVNLogDB.getRevisionEntries). These are required to add the dummy entries of the revision.
+    '''
+    copied_dirlist = []
+    deleted_dirlist = []
+    filepaths = []
+    for changedpath, changetype, copyfrompath, copyfromrev, pathtype, linesadded, linesdeleted, lc in details:
+        if(pathtype == 'D'):
+            if(copyfrompath != None and copyfromrev != None):
+                copied_dirlist.append((changedpath, copyfrompath, copyfromrev))
+            elif(changetype == 'D'):
+                deleted_dirlist.append(changedpath)
+        else:
+            filepaths.append(changedpath)
+    return(filepaths, copied_dirlist, deleted_dirlist)
+
+
+def parse_shard(shardstr):
+    '''
+    parse the revision range in the START:END format
+    '''
+    startrev, endrev = [int(rev) for rev in shardstr.split(':')]
+    if(startrev < 1 or endrev < startrev):
+        raise ValueError("Invalid shard revision range %s" % shardstr)
+    return(startrev, endrev)
+
+
 def getLogfileName(sqlitedbpath):
     '''
     create log file in using the directory path from the sqlitedbpath
@@ -281,7 +702,9 @@ def getquotedurl(url):
 
 
 def RunMain():
-    usage = "usage: %prog [options] <svnrepo root url> <sqlitedbpath>"
+    usage = "usage: %prog [options] <svnrepo root url> <sqlitedbpath>\n" \
+            "       %prog [options] --merge <sqlitedbpath> <shard sqlitedbpath> ...\n" \
+            "       %prog [options] --dump <dumpfile> <sqlitedbpath>"
     parser = ConfigOptionParser(usage)
     parser.set_defaults(updlinecount=False)
 
@@ -299,11 +722,55 @@ def RunMain():
                       help="Commit to sqlite database after given number of revisions (Default 10)")
     parser.add_option("", "--filediff", dest="filediff", default=False, action="store_true",
                       help="Force use file diff to calculate line count (will be slow)")
+    parser.add_option("-w", "--workers", dest="numworkers", default=1, action="store", type="int",
+                      help="Number of worker threads used to query the repository in parallel (Default 1)")
+    parser.add_option("", "--maxcatsize", dest="maxcatsize", default=16 * 1024, action="store", type="int",
+                      help="Files upto this size (in KB) are read in memory for line count. Larger files are "
+                      "exported to a temporary file. 0 always uses temporary file (Default 16384)")
+    parser.add_option("", "--writebatch", dest="writebatchsize", default=1000, action="store", type="int",
+                      help="Number of revision detail rows written to sqlite database in one batch (Default 1000)")
+    parser.add_option("", "--bulk-load", dest="bulkload", default=False, action="store_true",
+                      help="Faster initial conversion. Indexes are created at the end and database is not synced to "
+                      "disk during the conversion. Database may get corrupted if the conversion is interrupted.")
+    parser.add_option("", "--shard", dest="shard", default=None, action="store", type="string",
+                      help="Convert only the revisions START:END into the database. Databases of the revision "
+                      "ranges can be converted in parallel and then merged with --merge option")
+    parser.add_option("", "--merge", dest="merge", default=False, action="store_true",
+                      help="Merge the shard databases (created with --shard option) into sqlitedbpath")
+    parser.add_option("", "--update-linecount", dest="lcupdate", default=False, action="store_true",
+                      help="Update the line count of the revisions converted without -l option. New revisions "
+                      "are not converted. Interrupted update is resumed when run again")
+
+    parser.add_option("", "--dump", dest="dumpfile", default=None, action="store", type="string",
+                      help="Read the revisions from the dump file (created with 'svnadmin dump' or 'svnrdump dump') "
+                      "instead of the repository. Much faster for large repositories")
+
+    parser.add_option("", "--watch", dest="watch", default=False, action="store_true",
+                      help="Keep running and convert the new revisions as they are committed")
+    parser.add_option("", "--interval", dest="interval", default=60, action="store", type="int",
+                      help="Seconds between the checks for new revisions in watch mode (Default 60)")
+    parser.add_option("", "--notify-port", dest="notifyport", default=None, action="store", type="int",
+                      help="In watch mode, also check for new revisions when a UDP datagram is received on this "
+                      "localhost port. e.g. post-commit hook can send it to get the database updated immediately")
 
     (options, args) = parser.parse_args()
 
-    if(len(args) < 2):
+    if(options.dumpfile != None and len(args) == 1):
+        # only the database path is given. Convert the entire repository in the dump.
+        args = ['/'] + args
+
+    if(options.merge == True):
+        if(len(args) < 2):
+            print("Invalid number of arguments. Use svnlog2sqlite.py --help to see the details.")
+        else:
+            print("Merging %d shard databases into %s" % (len(args) - 1, args[0]))
+            merger = SVNShardMerge(args[0], verbose=options.verbose,
+                                   commit_after_numrev=options.commit_after_numrev)
+            merger.merge(args[1:])
+    elif(len(args) < 2):
         print("Invalid number of arguments. Use svnlog2sqlite.py --help to see the details.")
+    elif(options.watch == True and (options.dumpfile != None or options.shard != None)):
+        print("--watch option cannot be used with --dump or --shard options.")
     else:
         svnrepopath = args[0]
         sqlitedbpath = args[1]
@@ -318,9 +785,12 @@ def RunMain():
         if(not svnrepopath.endswith('/')):
             svnrepopath = svnrepopath + '/'
 
-        svnrepopath = getquotedurl(svnrepopath)
+        if(options.dumpfile == None):
+            svnrepopath = getquotedurl(svnrepopath)
 
         print("Updating the subversion log")
+        if(options.dumpfile != None):
+            print("Dump file : " + options.dumpfile)
         print("Repository : " + svnrepopath)
         print("SVN Log database filepath : %s" % sqlitedbpath)
         print("Extract Changed Line Count : %s" % options.updlinecount)
@@ -339,12 +809,26 @@ def RunMain():
                                 filemode='w')
             print("Debug Logging to file %s" % logfile)
 
+        shard = None
+        if(options.shard != None):
+            shard = parse_shard(options.shard)
+            print("Shard revisions : %d-%d" % shard)
+
         filediff = options.filediff
         conv = None
         conv = SVNLog2Sqlite(svnrepopath, sqlitedbpath, verbose=options.verbose,
                              username=options.username, password=options.password,
-                             commit_after_numrev=options.commit_after_numrev, filediff=filediff)
-        conv.convert(svnrevstartdate, svnrevenddate, options.updlinecount)
+                             commit_after_numrev=options.commit_after_numrev, filediff=filediff,
+                             numworkers=options.numworkers, maxcatsize=options.maxcatsize * 1024,
+                             writebatchsize=options.writebatchsize, bulkload=options.bulkload,
+                             shard=shard, dumpfile=options.dumpfile)
+        if(options.lcupdate == True):
+            print("Updating line count of the converted revisions")
+            conv.UpdateLineCountData()
+        elif(options.watch == True):
+            conv.watch(options.updlinecount, options.interval, options.notifyport)
+        else:
+            conv.convert(svnrevstartdate, svnrevenddate, options.updlinecount)
 
 if(__name__ == "__main__"):
     RunMain()
@@ -0,0 +1,501 @@
+'''
+svnlogcache.py
+Copyright (C) 2009 Nitin Bhide (nitinbhide@gmail.com)
+
+This module is part of SVNPlot (https://bitbucket.org/nitinbhide/svnplot) and is released under
+the New BSD License: http://www.opensource.org/licenses/bsd-license.php
+--------------------------------------------------------------------------------------
+
+Caches of the path information queried from the repository during the conversion of the
+subversion log. The caches are shared between the log clients of all the worker threads.
+'''
+import logging
+import threading
+import bisect
+import collections
+
+# number of revisions between the diff strategy decision of a revision and the revision results
+# used for that decision (see DiffStrategyStats)
+DIFFSTRATEGY_LAG = 64
+# maximum number of entries kept by the path history and the path information caches. Oldest
+# entries are removed when the limit is reached.
+HISTORY_MAXENTRIES = 2000000
+PATHCACHE_MAXENTRIES = 1000000
+# maximum number of line counts remembered by LineCountCache
+LINECOUNT_CACHE_SIZE = 200000
+
+
+def cachekey(path):
+    '''
+    caches store the paths without trailing '/' so that file and directory lookups
+    of the same path match.
+    '''
+    if(path != '/'):
+        path = path.rstrip('/')
+    return(path)
+
+
+def parentpaths(path):
+    '''
+    return the path and all its parent directories. e.g. for /trunk/src/a.c returns
+    /trunk/src/a.c, /trunk/src, /trunk
+    '''
+    while(path):
+        yield path
+        path = path.rpartition('/')[0]
+
+
+class PathHistory(object):
+
+    '''
+    Records the revisions in which a path is changed, deleted, replaced or copied. Revisions must
+    be added in order (i.e. by the log iterator) before any worker thread queries information about
+    that revision. Information cached about a path at revision 'x' is valid for revision 'y' only
+    if the path or one of its parent directories is not deleted/replaced between 'x' and 'y'.
+    When the history has more than 'maxentries' entries, the oldest revisions are removed from it.
+    Queries about the removed revisions return the conservative answer (i.e. path is changed or
+    removed), hence the cached information is not used for them.
+    '''
+
+    def __init__(self, startrevno, maxentries=HISTORY_MAXENTRIES):
+        # history is known only from 'startrevno' onwards.
+        self.startrevno = startrevno
+        self.lastrevno = startrevno - 1
+        self.removed = dict()
+        self.changed = dict()
+        # path -> list of (revno, copyfrompath, copyfromrevno)
+        self.copies = dict()
+        self.maxentries = maxentries
+        # (revno, number of entries added for revno) of the revisions in the history
+        self.revcounts = collections.deque()
+        self.numentries = 0
+        # revisions upto 'trimmedrev' are removed from the history.
+        self.trimmedrev = None
+        self.lock = threading.Lock()
+
+    def addRevision(self, revno, changed_paths):
+        '''
+        add the changed paths of revision log for 'revno'.
+        '''
+        with self.lock:
+            assert(revno > self.lastrevno)
+            count = 0
+            for change in changed_paths:
+                path = cachekey(change['path'])
+                self.changed.setdefault(path, []).append(revno)
+                count = count + 1
+                if(change['action'] == 'D' or change['action'] == 'R'):
+                    self.removed.setdefault(path, []).append(revno)
+                    count = count + 1
+                if(change.get('copyfrom_path') and change.get('copyfrom_revision') is not None):
+                    self.copies.setdefault(path, []).append(
+                        (revno, cachekey(change['copyfrom_path']), change['copyfrom_revision'].number))
+                    count = count + 1
+            self.lastrevno = revno
+            self.revcounts.append((revno, count))
+            self.numentries = self.numentries + count
+            if(self.numentries > self.maxentries):
+                self.__trim()
+
+    def __trim(self):
+        '''
+        remove the oldest revisions from the history till it has at most half of 'maxentries'
+        entries. Must be called with the lock held.
+        '''
+        cutoff = None
+        while(self.numentries > self.maxentries // 2 and len(self.revcounts) > 0):
+            cutoff, count = self.revcounts.popleft()
+            self.numentries = self.numentries - count
+        if(cutoff is None):
+            return
+        for table in (self.changed, self.removed):
+            for path in list(table.keys()):
+                revlist = table[path]
+                idx = bisect.bisect_right(revlist, cutoff)
+                if(idx == len(revlist)):
+                    del table[path]
+                elif(idx > 0):
+                    del revlist[:idx]
+        for path in list(self.copies.keys()):
+            copylist = [copy for copy in self.copies[path] if copy[0] > cutoff]
+            if(len(copylist) > 0):
+                self.copies[path] = copylist
+            else:
+                del self.copies[path]
+        self.trimmedrev = cutoff
+        logging.debug("Path history upto revision %d removed" % cutoff)
+
+    def isTrimmed(self, revno):
+        '''
+        return True if the changes after 'revno' are not completely known because the older
+        revisions are removed from the history.
+        '''
+        trimmedrev = self.trimmedrev
+        return(trimmedrev is not None and revno < trimmedrev)
+
+    def isKnown(self, revno):
+        '''
+        return True if all the changes till 'revno' are recorded.
+        '''
+        return(revno <= self.lastrevno)
+
+    def nextRemoval(self, path, revno):
+        '''
+        return the first revision after 'revno' in which the path or one of its parent directories
+        is deleted or replaced. Returns None, if there is no such revision recorded so far.
+        '''
+        if(self.isTrimmed(revno)):
+            # removals after revno may be removed from the history.
+            return(revno + 1)
+        nextrev = None
+        with self.lock:
+            for dirpath in parentpaths(path):
+                revlist = self.removed.get(dirpath)
+                if(revlist):
+                    idx = bisect.bisect_right(revlist, revno)
+                    if(idx < len(revlist) and (nextrev == None or revlist[idx] < nextrev)):
+                        nextrev = revlist[idx]
+        return(nextrev)
+
+    def isRemoved(self, path, fromrevno, torevno):
+        '''
+        check if path or one of its parent directories is deleted or replaced in
+        revisions fromrevno+1 to torevno.
+        '''
+        nextrev = self.nextRemoval(path, fromrevno)
+        return(nextrev != None and nextrev <= torevno)
+
+    def contentOrigin(self, path, revno):
+        '''
+        return (path, revno) in which the contents of the file 'path' in revision 'revno' were
+        created i.e. the last revision in which the file itself was changed. Files inside a copied
+        directory are not changed by the copy, hence their origin is in the copy source. Returns
+        None if the history is not known.
+        '''
+        origin = None
+        while(revno <= self.lastrevno):
+            with self.lock:
+                changedrev = None
+                revlist = self.changed.get(path)
+                if(revlist):
+                    idx = bisect.bisect_right(revlist, revno)
+                    if(idx > 0):
+                        changedrev = revlist[idx - 1]
+                fromrev = changedrev
+                if(fromrev is None):
+                    # file is not changed in the known history. It can still come from a copy
+                    # of its parent directory.
+                    fromrev = max(self.startrevno - 1, self.trimmedrev or 0)
+                # find the latest copy of the path (or its parent directory) after fromrev.
+                copy = None
+                for dirpath in parentpaths(path):
+                    for copyrev, copyfrompath, copyfromrev in self.copies.get(dirpath, []):
+                        if(fromrev < copyrev <= revno and (copy == None or copyrev > copy[0])):
+                            copy = (copyrev, dirpath, copyfrompath, copyfromrev)
+            if(copy == None):
+                if(changedrev is not None and not self.isRemoved(path, changedrev, revno)):
+                    origin = (path, changedrev)
+                break
+            copyrev, dirpath, copyfrompath, copyfromrev = copy
+            path = copyfrompath + path[len(dirpath):]
+            revno = copyfromrev
+        return(origin)
+
+    def isChanged(self, path, fromrevno, torevno):
+        '''
+        check if path is changed (including property changes) in revisions fromrevno+1 to torevno
+        or one of its parent directories is deleted or replaced.
+        '''
+        if(self.isTrimmed(fromrevno) and fromrevno < torevno):
+            return(True)
+        with self.lock:
+            revlist = self.changed.get(path)
+            changed = False
+            if(revlist):
+                idx = bisect.bisect_right(revlist, fromrevno)
+                changed = idx < len(revlist) and revlist[idx] <= torevno
+        return(changed or self.isRemoved(path, fromrevno, torevno))
+
+
+class PathRevCache(object):
+
+    '''
+    base class for caches of per path information queried for a given revision. Derived classes
+    decide till which revision the information remains valid.
+    '''
+
+    def __init__(self, history, maxentries=PATHCACHE_MAXENTRIES):
+        self.history = history
+        # path -> list of entries sorted on revision. First item of entry is the revision.
+        self.entries = dict()
+        self.maxentries = maxentries
+        self.numentries = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _insert(self, path, entry):
+        with self.lock:
+            entrylist = self.entries.setdefault(path, [])
+            idx = bisect.bisect_right([e[0] for e in entrylist], entry[0])
+            entrylist.insert(idx, entry)
+            self.numentries = self.numentries + 1
+            if(self.numentries > self.maxentries):
+                self.__trim()
+
+    def __trim(self):
+        '''
+        remove the older half of the entries (i.e. entries queried for the oldest revisions).
+        Must be called with the lock held.
+        '''
+        revlist = sorted(e[0] for entrylist in self.entries.values() for e in entrylist)
+        cutoff = revlist[len(revlist) // 2]
+        numentries = 0
+        for path in list(self.entries.keys()):
+            entrylist = [e for e in self.entries[path] if e[0] >= cutoff]
+            if(len(entrylist) > 0):
+                self.entries[path] = entrylist
+                numentries = numentries + len(entrylist)
+            else:
+                del self.entries[path]
+        self.numentries = numentries
+        logging.debug("%s entries before revision %d removed" % (self.__class__.__name__, cutoff))
+
+    def _lookup(self, path, revno):
+        '''
+        return the last entry for the path queried at or before revno. Returns None if history
+        till revno is not known.
+        '''
+        entry = None
+        if(self.history.isKnown(revno)):
+            with self.lock:
+                entrylist = self.entries.get(path)
+                if(entrylist):
+                    idx = bisect.bisect_right([e[0] for e in entrylist], revno)
+                    if(idx > 0):
+                        entry = entrylist[idx - 1]
+        return(entry)
+
+    def _updateStats(self, value):
+        if(value is None):
+            self.misses = self.misses + 1
+        else:
+            self.hits = self.hits + 1
+
+
+class PathKindCache(PathRevCache):
+
+    '''
+    Cache of the path types (F)ile or (D)irectory. A path type queried for a revision remains
+    valid till the path (or one of its parent directories) is deleted or replaced. The entries are
+    stored with the revision range [fromrev, torev) in which they are valid. torev is None till the
+    path is removed.
+    New entries are collected so that they can be saved in the database and reused in the
+    next incremental conversion.
+    '''
+
+    def __init__(self, history, maxentries=PATHCACHE_MAXENTRIES):
+        PathRevCache.__init__(self, history, maxentries)
+        self.newentries = []
+
+    def load(self, entries):
+        '''
+        load the entries (path, fromrev, torev, pathtype) stored in the database
+        '''
+        count = 0
+        for path, fromrev, torev, pathtype in entries:
+            self._insert(cachekey(path), [fromrev, torev, pathtype])
+            count = count + 1
+        logging.debug("Loaded %d path type entries" % count)
+
+    def get(self, path, revno):
+        '''
+        return the path type ('F' or 'D') of path in revision revno. Returns None if the path type
+        is not known.
+        '''
+        pathtype = None
+        path = cachekey(path)
+        entry = self._lookup(path, revno)
+        if(entry is not None):
+            fromrev, torev, entrytype = entry
+            if((torev == None or revno < torev) and not self.history.isRemoved(path, fromrev, revno)):
+                pathtype = entrytype
+        self._updateStats(pathtype)
+        return(pathtype)
+
+    def add(self, path, revno, pathtype):
+        '''
+        add the path type of path queried for the revision revno.
+        '''
+        assert(pathtype == 'F' or pathtype == 'D')
+        path = cachekey(path)
+        entry = [revno, None, pathtype]
+        self._insert(path, entry)
+        with self.lock:
+            self.newentries.append((path, entry))
+
+    def popNewEntries(self):
+        '''
+        return the entries (path, fromrev, torev, pathtype) added since the last call. torev is
+        updated from the path history if the path is already removed.
+        '''
+        with self.lock:
+            newentries = self.newentries
+            self.newentries = []
+
+        entries = []
+        for path, entry in newentries:
+            fromrev, torev, pathtype = entry
+            if(torev == None):
+                torev = self.history.nextRemoval(path, fromrev)
+            entries.append((path, fromrev, torev, pathtype))
+        return(entries)
+
+
+class MimeTypeCache(PathRevCache):
+
+    '''
+    Cache of the svn:mime-type property of files. Mime-type queried for a revision remains valid
+    till the file is modified again (a property change is also a modification) or one of its
+    parent directories is deleted or replaced. Files without svn:mime-type property are stored
+    with an empty mime-type.
+    '''
+
+    def get(self, path, revno):
+        '''
+        return the mime-type of the file in revision revno. Returns '' if file doesnot have
+        svn:mime-type property and None if the mime-type is not known.
+        '''
+        mimetype = None
+        path = cachekey(path)
+        entry = self._lookup(path, revno)
+        if(entry is not None):
+            fromrev, entrymimetype = entry
+            if(not self.history.isChanged(path, fromrev, revno)):
+                mimetype = entrymimetype
+        self._updateStats(mimetype)
+        return(mimetype)
+
+    def add(self, path, revno, mimetype):
+        '''
+        add the mime-type of the file queried for the revision revno. Use '' if the file doesnot
+        have svn:mime-type property.
+        '''
+        assert(mimetype is not None)
+        self._insert(cachekey(path), (revno, mimetype))
+
+
+class LineCountCache(object):
+
+    '''
+    Cache of the line counts of file contents. The key is the path and revision in which the
+    contents were created (see PathHistory.contentOrigin) rather than the path queried. Hence
+    files in branches/tags which are not modified after the copy share the line count with the
+    copy source, and the line count of a deleted file is the line count counted when it was added.
+    Only the 'maxsize' most recently used line counts are kept.
+    '''
+
+    def __init__(self, history, maxsize=LINECOUNT_CACHE_SIZE):
+        self.history = history
+        self.linecounts = collections.OrderedDict()
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getKey(self, path, revno):
+        '''
+        return cache key of the contents of file 'path' in revision revno. Returns None if the
+        contents cannot be identified.
+        '''
+        return(self.history.contentOrigin(cachekey(path), revno))
+
+    def get(self, key):
+        with self.lock:
+            linecount = self.linecounts.pop(key, None)
+            if(linecount is None):
+                self.misses = self.misses + 1
+            else:
+                # move the entry to the end i.e. most recently used.
+                self.linecounts[key] = linecount
+                self.hits = self.hits + 1
+        return(linecount)
+
+    def add(self, key, linecount):
+        with self.lock:
+            self.linecounts.pop(key, None)
+            self.linecounts[key] = linecount
+            if(len(self.linecounts) > self.maxsize):
+                self.linecounts.popitem(last=False)
+
+
+class DiffStrategyStats(object):
+
+    '''
+    Decides the diff strategy of each revision and counts the strategies used i.e. (R)evision level
+    diff, (F)ile level diffs or (M)ixed (revision level diff with file level diffs for the entries
+    which are not found in the revision diff). The strategy used for each revision is stored in the
+    SVNDiffStrategy table (see SVNRevLog.diffstrategy). Revision level diff is used as long as most of the changed files are found
+    in it. If the recent revision diffs could not be mapped to the changed files, file level diffs
+    are used and revision level diff is tried again after 'retryinterval' revisions.
+    The decisions are taken in the revision order and use only the results of the revisions decided
+    at least 'lag' revisions earlier. Hence the decisions donot depend on the order in which the
+    worker threads finish the revisions.
+    '''
+
+    def __init__(self, window=20, minmapratio=0.5, retryinterval=50, lag=DIFFSTRATEGY_LAG):
+        self.window = window
+        self.minmapratio = minmapratio
+        self.retryinterval = retryinterval
+        self.lag = lag
+        # ratio of changed files found in the recent revision level diffs.
+        self.recent = collections.deque(maxlen=window)
+        self.skipped = 0
+        # number of revisions decided so far and number of revision results used for decisions.
+        self.numdecided = 0
+        self.numapplied = 0
+        # decision position -> ratio of changed files found in the revision level diff
+        self.results = dict()
+        self.counts = dict()
+        self.lock = threading.Lock()
+
+    def useRevisionDiff(self):
+        '''
+        decide if the revision level diff should be tried for the next revision. Must be called in
+        the revision order. The results of the revisions decided 'lag' revisions earlier must be
+        added before this call. Returns the decision position of the revision (to be passed to
+        'add') and the decision.
+        '''
+        with self.lock:
+            position = self.numdecided
+            self.numdecided = position + 1
+            while(self.numapplied < position - self.lag):
+                mapratio = self.results.pop(self.numapplied, None)
+                if(mapratio is not None):
+                    self.recent.append(mapratio)
+                self.numapplied = self.numapplied + 1
+
+            userevdiff = True
+            if(len(self.recent) >= self.window // 2):
+                mapratio = sum(self.recent) / float(len(self.recent))
+                if(mapratio < self.minmapratio and self.skipped < self.retryinterval):
+                    userevdiff = False
+            if(userevdiff):
+                self.skipped = 0
+            else:
+                self.skipped = self.skipped + 1
+        return(position, userevdiff)
+
+    def add(self, position, revno, strategy, mapped=0, fallback=0):
+        '''
+        record the strategy used for revision revno decided at 'position'. mapped is number of changed
+        files found in the revision level diff and fallback is number of changed files which needed
+        file level diffs. Both are zero if the revision level diff is not tried.
+        '''
+        assert(strategy in ('R', 'F', 'M'))
+        with self.lock:
+            self.counts[strategy] = self.counts.get(strategy, 0) + 1
+            if(mapped + fallback > 0 and position >= self.numapplied):
+                self.results[position] = mapped / float(mapped + fallback)
+        logging.debug("Diff strategy for revision %d : %s (mapped %d, fallback %d)" % (
+            revno, strategy, mapped, fallback))
@@ -15,6 +15,8 @@ import datetime
 import time
 import os
 import string
+import threading
+import collections
 
 from six.moves import urllib
 
@@ -36,20 +38,85 @@ except:
 
 SVN_HEADER_ENCODING = 'utf-8'
 PRINTABLE_CHARSET = set(string.printable)
-
-def getDiffLineCountDict(diff_log):
-    diff_log = makeunicode(diff_log)
-    diffio = StringIO(diff_log)
+# minimum number of files in a directory to query their mime-types in a single call.
+MIMETYPE_BATCH_MINFILES = 2
+# files upto this size (in bytes) are read in memory with 'cat' for counting the lines. Larger
+# files are exported to a temporary file and the lines are counted from the file in chunks.
+LINECOUNT_MAXCATSIZE = 16 * 1024 * 1024
+LINECOUNT_CHUNKSIZE = 64 * 1024
+# maximum number of file sizes (from the 'info' queries) remembered by a log client for the
+# line counting of the same files.
+FILESIZE_CACHE_SIZE = 1000
+# number of (root url, path) -> url mappings remembered by makeRepoUrl (shared by all log clients).
+URL_CACHE_SIZE = 10000
+
+# revision level and file level diffs must give the same line counts for a file, hence both
+# compare the file contents (like 'svn diff' without --notice-ancestry).
+DIFF_IGNORE_ANCESTRY = True
+
+DIFF_NEWFILE_START = 'Index: '
+DIFF_NEWFILE_PROP_START = 'Property changes on: '
+DIFF_HEADER_STARTS = ('---', '+++', '@@', '===')
+
+
+def _diffPrefixes(linetype):
+    '''
+    return the prefixes used to classify the diff lines as text or bytes (same as the lines)
+    '''
+    prefixes = (DIFF_NEWFILE_START, DIFF_NEWFILE_PROP_START, DIFF_HEADER_STARTS, '-', '+')
+    if(linetype is not six.text_type):
+        prefixes = (DIFF_NEWFILE_START.encode('ascii'), DIFF_NEWFILE_PROP_START.encode('ascii'),
+                    tuple(start.encode('ascii') for start in DIFF_HEADER_STARTS), b'-', b'+')
+    return(prefixes)
+
+
+def _diffPath(diffline, prefix):
+    '''
+    extract the file path from 'Index: ' or 'Property changes on: ' line of the diff.
+    '''
+    path = diffline[len(prefix):].rstrip()
+    if(isinstance(path, six.binary_type)):
+        try:
+            path = path.decode('utf-8')
+        except UnicodeDecodeError:
+            path = path.decode('latin_1')
+    return(path)
+
+
+def iterDiffLines(diff_log):
+    '''
+    iterate over the lines of the diff text (unicode or bytes) without creating another copy of the
+    entire diff text.
+    '''
+    newline = '\n'
+    if(not isinstance(diff_log, six.text_type)):
+        newline = b'\n'
+    linestart = 0
+    difflen = len(diff_log)
+    while(linestart < difflen):
+        lineend = diff_log.find(newline, linestart)
+        if(lineend < 0):
+            lineend = difflen
+        yield diff_log[linestart:lineend]
+        linestart = lineend + 1
+
+
+def countDiffLines(difflines):
+    '''
+    count the added and deleted lines per file in a diff. difflines can be any iterable of diff lines
+    (unicode or bytes) e.g. an open file. Lines are classified by their first characters and only the
+    current line is kept in memory. Returns dictionary of filepath -> (linesadded, linesdeleted)
+    '''
     addlnCount = 0
     dellnCount = 0
     curfile = None
     diffCountDict = dict()
-    newfilediffstart = 'Index: '
-    newfilepropdiffstart = 'Property changes on: '
-    for diffline in diffio:
-        # remove the newline characters near the end of line
-        diffline = diffline.rstrip()
-        if(diffline.find(newfilediffstart) == 0):
+    prefixes = None
+    for diffline in difflines:
+        if(prefixes is None):
+            prefixes = _diffPrefixes(type(diffline))
+            newfilediffstart, newfilepropdiffstart, headerstarts, delstart, addstart = prefixes
+        if(diffline.startswith(newfilediffstart)):
             # diff for new file has started update the old filename.
             if(curfile != None):
                 diffCountDict[curfile] = (addlnCount, dellnCount)
@@ -59,22 +126,22 @@ def getDiffLineCountDict(diff_log):
             # Index line entry doesnot have '/' as start of file path. Hence add the '/'
             # so that path entries in revision log list match with the names in
             # the 'diff count' dictionary
-            logging.debug(diffline)
-            curfile = '/' + diffline[len(newfilediffstart):]
-        elif(diffline.find(newfilepropdiffstart) == 0):
+            curfile = '/' + _diffPath(diffline, newfilediffstart)
+            logging.debug("Index: %s" % curfile)
+        elif(diffline.startswith(newfilepropdiffstart)):
             # property modification diff has started. Ignore it.
             if(curfile != None):
                 diffCountDict[curfile] = (addlnCount, dellnCount)
-            curfile = '/' + diffline[len(newfilepropdiffstart):]
+            curfile = '/' + _diffPath(diffline, newfilepropdiffstart)
             # only properties are modified. there is no content change. hence
             # set the line count to 0,0
             if(curfile not in diffCountDict):
                 diffCountDict[curfile] = (0, 0)
-        elif(diffline.find('---') == 0 or diffline.find('+++') == 0 or diffline.find('@@') == 0 or diffline.find('===') == 0):
+        elif(diffline.startswith(headerstarts)):
             continue
-        elif(diffline.find('-') == 0):
+        elif(diffline.startswith(delstart)):
             dellnCount = dellnCount + 1
-        elif(diffline.find('+') == 0):
+        elif(diffline.startswith(addstart)):
             addlnCount = addlnCount + 1
 
     # update last file stat in the dictionary.
@@ -83,6 +150,101 @@ def getDiffLineCountDict(diff_log):
     return(diffCountDict)
 
 
+def getDiffLineCountDict(diff_log):
+    '''
+    get the dictionary of filepath -> (linesadded, linesdeleted) from the diff returned by pysvn.
+    diff_log can be the diff text (unicode or bytes) or a file like object containing the diff.
+    '''
+    difflines = diff_log
+    if(isinstance(diff_log, six.string_types) or isinstance(diff_log, six.binary_type)):
+        difflines = iterDiffLines(diff_log)
+    return(countDiffLines(difflines))
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def makeRepoUrl(rooturl, path):
+    '''
+    return the url of 'path' (relative to the repository root url). Urls are cached, since same
+    paths are queried many times (e.g. path type, mime-type and line count of a file).
+    '''
+    # remember 'path' can be a unicode string
+    try:
+        old_path = path
+        path = makeunicode(path)
+    except:
+        # not possible to encode path as unicode. Probably an latin-1 character with value > 127
+        # keep path as it is.
+        logging.warning('could not convert path to unicode %s' % old_path)
+        pass
+    # there are some characters which are valid pathname characters in unix but not in windows
+    # or vice-versa. Hence 'quote' the path and then convert it to url
+    # pathname2url internally calls 'quote'.
+    # 'quote' function cannot handle 'unicode' in python 2. It requies 'bytestring'.
+    # so we have to 'encode' the path
+    if six.PY2:
+        path = path.encode('utf-8')
+    pathurl = urllib.request.pathname2url(path)
+    return(rooturl + pathurl)
+
+
+def binaryExtList(binextlist):
+    '''
+    return tuple of binary file extensions (lower and upper case, with '.') from the extension list.
+    '''
+    binaryextlist = []
+    for binext in binextlist:
+        binext = binext.strip()
+        binext = '.' + binext
+        binaryextlist.append(binext)
+        binext = binext.upper()
+        binaryextlist.append(binext)
+    return(tuple(binaryextlist))
+
+
+def isTextMimeType(fmimetype):
+    '''
+    check if the mime-type is a text mime-type based on the standard svn text file logic.
+    '''
+    textMimeType = False
+    if(fmimetype.startswith('text/') or fmimetype == 'image/x-xbitmap' or fmimetype == 'image/x-xpixmap'):
+        textMimeType = True
+    return(textMimeType)
+
+
+class SVNLogClientPool(object):
+    '''
+    pool of log clients (clones of the main log client) used by the worker threads. A pysvn.Client
+    cannot be used from multiple threads at the same time. However it can be used by different
+    threads one after another. Hence clients released by the finished threads are given to the next
+    threads, and their authentication and cached root url are reused instead of creating new clients
+    for every conversion run.
+    '''
+
+    def __init__(self, logclient):
+        self.logclient = logclient
+        self.lock = threading.Lock()
+        self.clients = []
+
+    def acquire(self):
+        '''
+        return a log client for exclusive use of the calling thread till it is released.
+        '''
+        logclient = None
+        with self.lock:
+            if(len(self.clients) > 0):
+                logclient = self.clients.pop()
+        if(logclient == None):
+            logclient = self.logclient.clone()
+        else:
+            # caches are created again for each conversion. Share the current caches.
+            self.logclient.shareState(logclient)
+        return(logclient)
+
+    def release(self, logclient):
+        with self.lock:
+            self.clients.append(logclient)
+
+
 class SVNLogClient(object):
 
     def __init__(self, svnrepourl, binaryext=[], username=None, password=None):
@@ -90,6 +252,21 @@ class SVNLogClient(object):
         self.tmppath = None
         self.username = None
         self.password = None
+        # path history and path type cache shared by all the log clients of a conversion.
+        self.pathhistory = None
+        self.pathkinds = None
+        self.mimetypes = None
+        self.diffstats = None
+        self.linecounts = None
+        self.maxcatsize = LINECOUNT_MAXCATSIZE
+        # (path, revno) -> file size in bytes. Sizes returned by the 'info' queries of isDirectory
+        # are used by the line count of the same file.
+        self.filesizes = collections.OrderedDict()
+        # time spent in the repository queries. Shared by all the clones.
+        self.timers = StageTimers()
+        # login prompts of the log client and all its clones are serialized with this lock.
+        self.authlock = threading.Lock()
+        self.clientpool = None
         self._updateTempPath()
         self.svnrepourl = urllib.parse.unquote(svnrepourl)
         self.svnclient = pysvn.Client()
@@ -100,18 +277,52 @@ class SVNLogClient(object):
         self.setbinextlist(binaryext)
         self.set_user_password(username, password)
 
+    def clone(self):
+        '''
+        create a new log client for the same repository with the same settings. pysvn.Client
+        objects cannot be used from multiple threads at the same time, hence each worker thread
+        needs its own log client.
+        '''
+        logclient = SVNLogClient(self.svnrepourl, username=self.username, password=self.password)
+        # svnrepourl is already unquoted. Copy the values directly instead of unquoting them
+        # again in the constructor.
+        logclient.svnrepourl = self.svnrepourl
+        # authentication callbacks of all clones go to this client, so that the username/password
+        # entered once is used by all the clients.
+        logclient.authlock = self.authlock
+        logclient.svnclient.callback_get_login = self.get_login
+        logclient.svnclient.callback_ssl_server_trust_prompt = self.ssl_server_trust_prompt
+        logclient.svnclient.callback_ssl_client_cert_password_prompt = self.ssl_client_cert_password_prompt
+        self.shareState(logclient)
+        return(logclient)
+
+    def shareState(self, logclient):
+        '''
+        copy the settings and the shared caches to the cloned log client.
+        '''
+        logclient.svnrooturl = self.svnrooturl
+        logclient.binaryextlist = self.binaryextlist
+        logclient.pathhistory = self.pathhistory
+        logclient.pathkinds = self.pathkinds
+        logclient.mimetypes = self.mimetypes
+        logclient.diffstats = self.diffstats
+        logclient.linecounts = self.linecounts
+        logclient.timers = self.timers
+        logclient.maxcatsize = self.maxcatsize
+
+    def getClientPool(self):
+        '''
+        return the pool of cloned log clients for the worker threads.
+        '''
+        if(self.clientpool == None):
+            self.clientpool = SVNLogClientPool(self)
+        return(self.clientpool)
+
     def setbinextlist(self, binextlist):
         '''
         set extensionlist for binary files with some cleanup if required.
         '''
-        binaryextlist = []
-        for binext in binextlist:
-            binext = binext.strip()
-            binext = '.' + binext
-            binaryextlist.append(binext)
-            binext = binext.upper()
-            binaryextlist.append(binext)
-        self.binaryextlist = tuple(binaryextlist)
+        self.binaryextlist = binaryExtList(binextlist)
 
     def set_user_password(self, username, password):
         if(username != None and username != ''):
@@ -123,11 +334,12 @@ class SVNLogClient(object):
 
     def get_login(self, realm, username, may_save):
         logging.debug("This is a svnclient.callback_get_login event. ")
-        if(self.username == None):
-            self.username = input("username for %s:" % realm)
-        #save = True
-        if(self.password == None):
-            self.password = getpass.getpass()
+        with self.authlock:
+            if(self.username == None):
+                self.username = input("username for %s:" % realm)
+            #save = True
+            if(self.password == None):
+                self.password = getpass.getpass()
         if(self.username == None or self.username == ''):
             retcode = False
         else:
@@ -138,15 +350,18 @@ class SVNLogClient(object):
         retcode = True
         accepted_failures = trust_dict['failures']
         save = 1
-        print("trusting: ")
-        print(trust_dict)
+        with self.authlock:
+            print("trusting: ")
+            print(trust_dict)
         return retcode, accepted_failures, save
 
     def ssl_client_cert_password_prompt(self, realm, may_save):
         """callback_ssl_client_cert_password_prompt is called each time subversion needs a password in the realm to use a client certificate and has no cached credentials. """
         logging.debug(
             "callback_ssl_client_cert_password_prompt called to gain password for subversion in realm %s ." % (realm))
-        password = getpass.getpass()
+        retcode = True
+        with self.authlock:
+            password = getpass.getpass()
         return retcode, password, may_save
 
     def _updateTempPath(self):
@@ -344,9 +559,10 @@ class SVNLogClient(object):
 
         logging.debug(
             "Trying to get revision logs [%d:%d]" % (startrevno, endrevno))
-        revlog = self.svnclient.log(url,
-                                    revision_start=startrev, revision_end=endrev, limit=cachesize,
-                                    discover_changed_paths=detailedLog)
+        with self.timers.measure('log'):
+            revlog = self.svnclient.log(url,
+                                        revision_start=startrev, revision_end=endrev, limit=cachesize,
+                                        discover_changed_paths=detailedLog)
         return(revlog)
 
     def getRevDiff(self, revno):
@@ -356,9 +572,10 @@ class SVNLogClient(object):
         diff_log = None
 
         logging.info("Trying to get revision diffs url:%s" % url)
-        diff_log = self.svnclient.diff(self.tmppath, url, revision1=rev1, revision2=rev2,
-                                       recurse=True, ignore_ancestry=True, ignore_content_type=False,
-                                       header_encoding=SVN_HEADER_ENCODING, diff_deleted=True)
+        with self.timers.measure('diff'):
+            diff_log = self.svnclient.diff(self.tmppath, url, revision1=rev1, revision2=rev2,
+                                           recurse=True, ignore_ancestry=DIFF_IGNORE_ANCESTRY, ignore_content_type=False,
+                                           header_encoding=SVN_HEADER_ENCODING, diff_deleted=True)
 
         return diff_log
 
@@ -380,10 +597,11 @@ class SVNLogClient(object):
         logging.debug("prev url=%s" % prev_url)
 
         try:
-            diff_log = self.svnclient.diff(self.tmppath, url_or_path=prev_url, revision1=prev_rev,
-                                           url_or_path2=cur_url, revision2=cur_rev,
-                                           recurse=True, ignore_ancestry=False, ignore_content_type=False,
-                                           header_encoding=SVN_HEADER_ENCODING, diff_deleted=True)
+            with self.timers.measure('diff'):
+                diff_log = self.svnclient.diff(self.tmppath, url_or_path=prev_url, revision1=prev_rev,
+                                               url_or_path2=cur_url, revision2=cur_rev,
+                                               recurse=True, ignore_ancestry=DIFF_IGNORE_ANCESTRY, ignore_content_type=False,
+                                               header_encoding=SVN_HEADER_ENCODING, diff_deleted=True)
         except pysvn.ClientError as exp:
             logging.exception("Error in getting file level revision diff")
             logging.debug("url : %s" % cur_url)
@@ -459,14 +677,18 @@ class SVNLogClient(object):
         '''
         return(filepath.endswith(self.binaryextlist))
 
-    def __isTextMimeType(self, fmimetype):
+    def __getMimeType(self, url, revno):
         '''
-        check if the mime-type is a text mime-type based on the standard svn text file logic.
+        get the svn:mime-type property of the file. Returns '' if the property is not set.
         '''
-        textMimeType = False
-        if(fmimetype.startswith('text/') or fmimetype == 'image/x-xbitmap' or fmimetype == 'image/x-xpixmap'):
-            textMimeType = True
-        return(textMimeType)
+        fmimetype = ''
+        rev = pysvn.Revision(pysvn.opt_revision_kind.number, revno)
+        proplist = self.svnclient.proplist(url, revision=rev)
+        if(len(proplist) > 0):
+            assert(len(proplist) == 1)
+            path, propdict = proplist[0]
+            fmimetype = propdict.get('svn:mime-type', '')
+        return(fmimetype)
 
     def __isBinaryFile(self, filepath, revno):
         '''
@@ -479,20 +701,21 @@ class SVNLogClient(object):
         # if explicit mime-type is not found always treat the file as 'text'
         binary = False
         url = self.getUrl(filepath)
-        rev = pysvn.Revision(pysvn.opt_revision_kind.number, revno)
 
         try:
-            proplist = self.svnclient.proplist(url, revision=rev)
-            if(len(proplist) > 0):
-                assert(len(proplist) == 1)
-                path, propdict = proplist[0]
-                if('svn:mime-type' in propdict):
-                    fmimetype = propdict['svn:mime-type']
-                    # print "found mime-type file: %s mimetype : %s" % (filepath,
-                    # fmimetype)
-                    if(self.__isTextMimeType(fmimetype) == False):
-                        # mime type is not a 'text' mime type.
-                        binary = True
+            fmimetype = None
+            if(self.mimetypes is not None):
+                fmimetype = self.mimetypes.get(filepath, revno)
+            if(fmimetype is None):
+                with self.timers.measure('isbinary'):
+                    fmimetype = self.__getMimeType(url, revno)
+                if(self.mimetypes is not None):
+                    self.mimetypes.add(filepath, revno, fmimetype)
+            # print "found mime-type file: %s mimetype : %s" % (filepath,
+            # fmimetype)
+            if(fmimetype != '' and isTextMimeType(fmimetype) == False):
+                # mime type is not a 'text' mime type.
+                binary = True
         except Exception as exp:
             #if proplist generates an error like 'unknown node kind', we try
             #extracting the file and then check contents to see if it is binary
@@ -501,11 +724,51 @@ class SVNLogClient(object):
 
     def __isBinaryFile2(self, file_url, revno):
         rev = pysvn.Revision(pysvn.opt_revision_kind.number, revno)
-        import pdb
-        pdb.set_trace()
         contents = self.svnclient.cat(file_url, revision=rev)
         contents = contents[:1024]
-        return all([ch in PRINTABLE_CHARSET for ch in contents])
+        if(isinstance(contents, six.binary_type)):
+            contents = contents.decode('latin_1')
+        return not all([ch in PRINTABLE_CHARSET for ch in contents])
+
+    def prefetchMimeTypes(self, pathrevlist):
+        '''
+        query the svn:mime-type property of multiple files (list of (filepath, revno)) and add it to
+        the mime-type cache. Files in the same directory and revision are queried with a single
+        'propget' call (depth 'files') instead of one 'proplist' call per file.
+        '''
+        if(self.mimetypes is None):
+            return
+
+        dirfiles = dict()
+        for filepath, revno in pathrevlist:
+            if(not self.__isBinaryFileExt(filepath) and self.mimetypes.get(filepath, revno) is None):
+                dirpath = parent_dirname(filepath)
+                dirfiles.setdefault((dirpath, revno), set()).add(filepath)
+
+        for (dirpath, revno), filepaths in six.iteritems(dirfiles):
+            if(len(filepaths) < MIMETYPE_BATCH_MINFILES):
+                # let isBinaryFile query the single file.
+                continue
+            logging.debug("Querying mime-types of %d files in %s revision:%d" % (
+                len(filepaths), dirpath, revno))
+            rev = pysvn.Revision(pysvn.opt_revision_kind.number, revno)
+            try:
+                with self.timers.measure('isbinary'):
+                    propdict = self.svnclient.propget('svn:mime-type', self.getUrl(dirpath),
+                                                      revision=rev, depth=pysvn.depth.files)
+            except pysvn.ClientError:
+                # fall back to the queries of the individual files.
+                logging.exception("Error in getting mime-types of files in %s" % dirpath)
+                continue
+
+            rooturl = self.getRootUrl()
+            dirmimetypes = dict()
+            for fileurl, fmimetype in six.iteritems(propdict):
+                fileurl = urllib.parse.unquote(fileurl)
+                if(fileurl.startswith(rooturl)):
+                    dirmimetypes[normurlpath(fileurl[len(rooturl):])] = fmimetype
+            for filepath in filepaths:
+                self.mimetypes.add(filepath, revno, dirmimetypes.get(filepath, ''))
 
     def isBinaryFile(self, filepath, revno):
         assert(filepath is not None)
@@ -522,12 +785,21 @@ class SVNLogClient(object):
         logging.debug("isDirectory: path %s revno %d" % (changepath, revno))
         isDir = False
 
+        if(self.pathkinds is not None):
+            pathtype = self.pathkinds.get(changepath, revno)
+            if(pathtype is not None):
+                return(pathtype == 'D')
+
         try:
-            entry = self.getInfo(changepath, revno)
+            with self.timers.measure('isdirectory'):
+                entry = self.getInfo(changepath, revno)
             filename, info_dict = entry[0]
             if(info_dict.kind == pysvn.node_kind.dir):
                 isDir = True
                 logging.debug("path %s is Directory" % changepath)
+            else:
+                self.__addFileSize(changepath, revno, getattr(info_dict, 'size', None))
+            self.cachePathType(changepath, revno, 'D' if isDir else 'F')
         except pysvn.ClientError as expinst:
             # it is possible that changedpath is deleted (even if changetype is not 'D') and
             # doesnot exist in the revno. In this case, we will get a ClientError exception.
@@ -537,39 +809,117 @@ class SVNLogClient(object):
 
         return(isDir)
 
-    def _getLineCount(self, filepath, revno):
-        linecount = 0
+    def cachePathType(self, path, revno, pathtype):
+        '''
+        add the path type of a path in given revision to the path type cache (if any)
+        '''
+        if(self.pathkinds is not None):
+            self.pathkinds.add(path, revno, pathtype)
+
+    def __addFileSize(self, path, revno, size):
+        # size is None for older subversion versions and -1 (SVN_INVALID_FILESIZE) if unknown.
+        if(size is not None and size >= 0):
+            self.filesizes[(path, revno)] = size
+            if(len(self.filesizes) > FILESIZE_CACHE_SIZE):
+                self.filesizes.popitem(last=False)
+
+    def _getFileSize(self, filepath, url, rev):
+        '''
+        return the size of file in bytes. Returns None if the size is not known. The size returned
+        by the earlier 'info' query is used if available, otherwise the repository is queried.
+        '''
+        size = self.filesizes.pop((filepath, rev.number), None)
+        if(size is not None):
+            return(size)
+        entries = self.svnclient.list(url, revision=rev, recurse=False,
+                                      dirent_fields=pysvn.SVN_DIRENT_SIZE)
+        size = None
+        if(len(entries) > 0):
+            size = entries[0][0].size
+        return(size)
+
+    def _isSymLink(self, url, rev):
+        proplist = self.svnclient.proplist(url, revision=rev)
+        return(len(proplist) > 0 and 'svn:special' in proplist[0][1])
 
+    def _getLineCount(self, filepath, revno):
         logging.info("Trying to get linecount for %s" % (filepath))
         rev = pysvn.Revision(pysvn.opt_revision_kind.number, revno)
         url = self.getUrl(filepath)
-        #contents = self.svnclient.cat(url, revision = rev)
-        #matches = re.findall("$", contents, re.M )
-        #linecount1 = 0
-        # if( matches != None):
-        #    linecount1 = len(matches)
-        # export the file to a tempfolder url
+        contentkey = None
+        linecount = None
+        if(self.linecounts is not None):
+            # same contents may be already counted in other path (e.g. copy source).
+            contentkey = self.linecounts.getKey(filepath, revno)
+            if(contentkey is not None):
+                linecount = self.linecounts.get(contentkey)
+
+        if(linecount is None):
+            size = None
+            if(self.maxcatsize > 0):
+                size = self._getFileSize(filepath, url, rev)
+            linecount = self._getContentLineCount(filepath, url, rev, size)
+            if(contentkey is not None):
+                self.linecounts.add(contentkey, linecount)
+        return(linecount)
+
+    def _getContentLineCount(self, filepath, url, rev, size):
+        '''
+        read the file contents and count the lines. Files upto maxcatsize are read in memory and
+        larger files (or files with unknown size) are exported to a temporary file.
+        '''
+        linecount = 0
+        if(size is not None and size <= self.maxcatsize):
+            # small file. Get the contents in memory and count the newlines.
+            contents = self.svnclient.cat(url, revision=rev)
+            if(isinstance(contents, six.text_type)):
+                contents = contents.encode('utf-8')
+            # 'cat' of a symbolic link returns 'link <target>'. Check svn:special property only
+            # when the contents look like a link.
+            if(contents.startswith(b'link ') and b'\n' not in contents and self._isSymLink(url, rev)):
+                logging.debug("%s is symbolic link" % filepath)
+            else:
+                linecount = contents.count(b'\n')
+                if(len(contents) > 0 and not contents.endswith(b'\n')):
+                    # last line without newline character at the end.
+                    linecount = linecount + 1
+                logging.debug("%s linecount : %d" % (filepath, linecount))
+        else:
+            linecount = self._getExportedLineCount(filepath, url, rev)
+        return(linecount)
+
+    def _getExportedLineCount(self, filepath, url, rev):
+        '''
+        export the file to a temporary file and count the lines by reading the file in chunks.
+        Used for large files to avoid reading the complete file contents in memory.
+        '''
+        linecount = 0
         outpath = tempfile.mktemp('svnplot', dir=self.tmppath)
 
         self.svnclient.export(
             url, dest_path=outpath, revision=rev, ignore_externals=True, recurse=False)
-        if(not os.path.islink(outpath)):
-            # now read the file and count the lines
-            with open(outpath, 'r') as f:
-                contents = f.readlines()
-            linecount = len(contents)
-            logging.debug("%s linecount : %d" % (filepath, linecount))
-        else:
-            linecount = 0
-            logging.debug("%s is symbolic link" % filepath)
-
-        os.unlink(outpath)
+        try:
+            if(not os.path.islink(outpath)):
+                # now read the file and count the lines
+                lastchunk = b''
+                with open(outpath, 'rb') as f:
+                    for chunk in iter(lambda: f.read(LINECOUNT_CHUNKSIZE), b''):
+                        linecount = linecount + chunk.count(b'\n')
+                        lastchunk = chunk
+                if(len(lastchunk) > 0 and not lastchunk.endswith(b'\n')):
+                    linecount = linecount + 1
+                logging.debug("%s linecount : %d" % (filepath, linecount))
+            else:
+                logging.debug("%s is symbolic link" % filepath)
+        finally:
+            os.unlink(outpath)
         return(linecount)
 
     def getLineCount(self, filepath, revno):
         linecount = 0
         if(self.isBinaryFile(filepath, revno) == False):
-            linecount = self._getLineCount(filepath, revno)
+            with self.timers.measure('linecount'):
+                linecount = self._getLineCount(filepath, revno)
 
         return(linecount)
 
@@ -602,37 +952,72 @@ class SVNLogClient(object):
             self.getRootUrl2()
 
             logging.debug("found rooturl %s" % self.svnrooturl)
+            if(self.svnrooturl != None):
+                self.svnrooturl = urllib.parse.unquote(self.svnrooturl)
 
         # if the svnrooturl is None at this point, then raise an exception
         if(self.svnrooturl == None):
             raise RuntimeError("Repository Root not found")
 
-        self.svnrooturl = urllib.parse.unquote(self.svnrooturl)
         return(self.svnrooturl)
 
     def getUrl(self, path):
+        '''
+        return the url of the path (relative to repository root).
+        '''
         url = self.svnrepourl
         if(path.strip() != ""):
-            # remember 'path' can be a unicode string
-            try:
-                old_path = path
-                path = makeunicode(path)
-            except:
-                # not possible to encode path as unicode. Probably an latin-1 character with value > 127
-                # keep path as it is.
-                logging.warning('could not convert path to unicode %s' % old_path)
-                pass
-            # there are some characters which are valid pathname characters in unix but not in windows
-            # or vice-versa. Hence 'quote' the path and then convert it to url
-            # pathname2url internally calls 'quote'.
-            # 'quote' function cannot handle 'unicode' in python 2. It requies 'bytestring'.
-            # so we have to 'encode' the path
-            if six.PY2:
-                path = path.encode('utf-8')
-            pathurl = urllib.request.pathname2url(path)
-            url = self.getRootUrl()+pathurl
+            url = makeRepoUrl(self.getRootUrl(), path)
         return(url)
 
+    def getRepoPathPrefix(self):
+        '''
+        return the path of repository url relative to the repository root (e.g. '/trunk').
+        Returns empty string if the repository url is same as root.
+        '''
+        repourl = self.svnrepourl.rstrip('/')
+        rooturl = self.getRootUrl().rstrip('/')
+        prefix = ''
+        if(repourl.startswith(rooturl)):
+            prefix = repourl[len(rooturl):]
+        return(prefix)
+
+    def mapDiffPaths(self, diffcountdict, filepaths):
+        '''
+        paths in the 'Index:' lines of revision diff are relative to the repository url (and
+        some svn versions report full urls) while the changed paths in the revision log are
+        relative to repository root. Map the diff paths to the given changed file paths. Returns
+        dictionary of changed file path -> (linesadded, linesdeleted) of the paths found in the diff.
+        '''
+        prefix = self.getRepoPathPrefix()
+        rooturl = self.getRootUrl().rstrip('/')
+        filepaths = set(filepaths)
+        mapped = dict()
+        unmapped = []
+        for diffpath, linecount in six.iteritems(diffcountdict):
+            if(diffpath[1:].startswith(rooturl)):
+                diffpath = diffpath[len(rooturl) + 1:]
+            if(prefix + diffpath in filepaths):
+                mapped[prefix + diffpath] = linecount
+            elif(diffpath in filepaths):
+                mapped[diffpath] = linecount
+            else:
+                unmapped.append((diffpath, linecount))
+
+        # remaining paths are matched if only one changed file path ends with the diff path (at
+        # a path separator, otherwise 'a.txt' will match '/trunk/ba.txt'). Unmatched paths are
+        # counted with file level diffs.
+        remaining = filepaths.difference(mapped)
+        for diffpath, linecount in unmapped:
+            suffix = '/' + diffpath.lstrip('/')
+            matches = [path for path in remaining if path == diffpath or path.endswith(suffix)]
+            if(len(matches) == 1):
+                mapped[matches[0]] = linecount
+                remaining.discard(matches[0])
+            else:
+                logging.debug("Could not map the diff path %s" % diffpath)
+        return(mapped)
+
     def isRepoUrlSameAsRoot(self):
         repourl = self.svnrepourl.rstrip('/')
         rooturl = self.getRootUrl()
@@ -13,6 +13,50 @@ import logging
 from contextlib import closing
 import sqlite3
 
+# number of SVNLog/SVNLogDetail rows buffered before they are written with a single 'executemany'
+WRITE_BATCH_SIZE = 1000
+
+# secondary indexes which can be dropped during the bulk load and created again at the end.
+BULKLOAD_INDEXES = [
+    ('svnlogdtlrevnoidx', "CREATE INDEX if not exists svnlogdtlrevnoidx ON SVNLogDetail (revno ASC)"),
+    ('svnlogdtlchangepathidx',
+     "CREATE INDEX if not exists svnlogdtlchangepathidx ON SVNLogDetail (changedpathid ASC)"),
+    ('svnlogdtlcopypathidx',
+     "CREATE INDEX if not exists svnlogdtlcopypathidx ON SVNLogDetail (copyfrompathid ASC)"),
+    ('svnpathidx', "CREATE INDEX IF NOT EXISTS svnpathidx ON SVNPaths (path ASC)"),
+    ('svnlogauthoridx', "CREATE INDEX IF NOT EXISTS svnlogauthoridx ON SVNLog (authorid ASC)")]
+
+# sqlite page cache size used during the bulk load (negative value is size in KB)
+BULKLOAD_CACHE_SIZE = -256 * 1024
+
+
+def createAuthorTable(cur):
+    '''
+    create the SVNAuthors table and set the 'authorid' of the existing SVNLog entries (i.e. database
+    created by older version of svnplot). Author names differing only in case are the same author.
+    '''
+    cur.execute("CREATE TABLE IF NOT EXISTS SVNAuthors(id INTEGER PRIMARY KEY AUTOINCREMENT, \
+                name text COLLATE NOCASE UNIQUE)")
+    cur.execute("PRAGMA table_info(SVNLog)")
+    if('authorid' not in [row[1] for row in cur.fetchall()]):
+        cur.execute("ALTER TABLE SVNLog ADD COLUMN authorid integer")
+    cur.execute("INSERT OR IGNORE INTO SVNAuthors(name) SELECT coalesce(author, '') FROM SVNLog \
+                ORDER BY revno")
+    cur.execute("UPDATE SVNLog SET authorid=(SELECT id FROM SVNAuthors \
+                WHERE SVNAuthors.name=coalesce(SVNLog.author, ''))")
+    if(cur.rowcount > 0):
+        logging.info("Updated author id of %d SVNLog entries" % cur.rowcount)
+
+
+def dirpathrange(dirpath):
+    '''
+    return the range (start, end) such that paths under the directory dirpath (e.g. /trunk/) are
+    greater than start and less than end ('0' is next character after '/'). Unlike 'like' queries
+    the range can use the path index and doesnot treat '_' and '%' in paths as wildcards.
+    '''
+    dirpath = dirpath.rstrip('/')
+    return(dirpath + '/', dirpath + '0')
+
 
 class SVNLogDB(object):
 
@@ -28,6 +72,23 @@ class SVNLogDB(object):
         self.connection_params = dict(**connections_params)
         self._query_cur = None
         self._upd_cur = None
+        # in memory path -> id map of SVNPaths table. New paths are assigned the ids immediately
+        # but inserted in the table in bulk (see flush)
+        self._pathids = None
+        self._nextpathid = 1
+        self._newpaths = []
+        # SVNLog and SVNLogDetail rows not yet written to the database (see flush)
+        self._logrows = []
+        self._detailrows = []
+        # revno -> conversion state of the revisions not yet written to SVNRevJournal (see flush)
+        self._revstates = dict()
+        # revno -> (strategy, mapped, fallback) not yet written to SVNDiffStrategy (see flush)
+        self._diffstrategies = dict()
+        # author name -> id in SVNAuthors table
+        self._authorids = dict()
+        self.writebatchsize = WRITE_BATCH_SIZE
+        # names of the indexes dropped for bulk load.
+        self._deferredindexes = set()
 
     def connect(self):
         '''
@@ -35,11 +96,13 @@ class SVNLogDB(object):
         '''
         self._connect()
         self.CreateTables()
+        self._loadPathIds()
 
     def commit(self):
         '''
         commit the running transaction at this point
         '''
+        self.flush()
         self._commit()
 
     def close(self):
@@ -48,9 +111,20 @@ class SVNLogDB(object):
         '''
         self.commit()
         self._close()
+        # cursors of the closed connection cannot be used after connecting again.
+        self._query_cur = None
+        self._upd_cur = None
 
     def rollback(self):
         self._rollback()
+        # path ids assigned after last commit are not valid anymore. Reload them on next use.
+        self._pathids = None
+        self._newpaths = []
+        self._logrows = []
+        self._detailrows = []
+        self._revstates = dict()
+        self._diffstrategies = dict()
+        self._authorids = dict()
 
     @property
     def query_cur(self):
@@ -69,8 +143,14 @@ class SVNLogDB(object):
         create required tables, views and indices
         '''
         with closing(self._new_cursor()) as cur:
+            cur.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type='table' and name='SVNAuthors'")
+            authorsexist = cur.fetchone()[0] > 0
             cur.execute("create table if not exists SVNLog(revno integer, commitdate timestamp, author text, msg text, \
-                                addedfiles integer, changedfiles integer, deletedfiles integer)")
+                                addedfiles integer, changedfiles integer, deletedfiles integer, authorid integer)")
+            # author names are stored once in SVNAuthors table and SVNLog refers them by 'authorid'.
+            if(authorsexist == False):
+                createAuthorTable(cur)
             cur.execute("create table if not exists SVNLogDetail(revno integer, changedpathid integer, changetype text, copyfrompathid integer, copyfromrev integer, \
                         pathtype text, linesadded integer, linesdeleted integer, lc_updated char, entrytype char)")
             cur.execute(
@@ -90,14 +170,50 @@ class SVNLogDB(object):
             # line count data later
             cur.execute(
                 "CREATE INDEX if not exists svnlogrevnoidx ON SVNLog (revno ASC)")
+            for indexname, indexsql in BULKLOAD_INDEXES:
+                if(indexname not in self._deferredindexes):
+                    cur.execute(indexsql)
+            # path type (F/D) of a path queried from repository. The path type is valid for the
+            # revisions fromrev to torev-1. torev is null till the path is deleted/replaced.
+            cur.execute("CREATE TABLE IF NOT EXISTS SVNPathKind(path text, fromrev integer, torev integer, \
+                        pathtype char)")
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS svnpathkindidx ON SVNPathKind (path ASC, fromrev ASC)")
+            # files present in the repository. File 'path' is added in revision 'addrev' and deleted
+            # in revision 'delrev' (null if it is not deleted yet). Files present under a directory
+            # in a revision can be queried with a path range instead of scanning SVNLogDetail.
+            cur.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type='table' and name='SVNLiveFiles'")
+            livefilesexist = cur.fetchone()[0] > 0
+            cur.execute("CREATE TABLE IF NOT EXISTS SVNLiveFiles(pathid integer, path text, addrev integer, \
+                        delrev integer)")
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS svnlivefilespathidx ON SVNLiveFiles (path ASC, addrev ASC)")
             cur.execute(
-                "CREATE INDEX if not exists svnlogdtlrevnoidx ON SVNLogDetail (revno ASC)")
+                "CREATE INDEX IF NOT EXISTS svnlivefilesidx ON SVNLiveFiles (pathid ASC)")
+            if(livefilesexist == False):
+                self.__createLiveFiles(cur)
+            # current line count of a path (i.e. sum of lines added - lines deleted of all the
+            # revisions upto 'lastrev')
             cur.execute(
-                "CREATE INDEX if not exists svnlogdtlchangepathidx ON SVNLogDetail (changedpathid ASC)")
+                "SELECT count(*) FROM sqlite_master WHERE type='table' and name='PathLoC'")
+            pathlocexist = cur.fetchone()[0] > 0
             cur.execute(
-                "CREATE INDEX if not exists svnlogdtlcopypathidx ON SVNLogDetail (copyfrompathid ASC)")
+                "CREATE TABLE IF NOT EXISTS PathLoC(pathid integer PRIMARY KEY, loc integer, lastrev integer)")
+            if(pathlocexist == False):
+                cur.execute("INSERT INTO PathLoC(pathid, loc, lastrev) \
+                        SELECT changedpathid, total(linesadded) - total(linesdeleted), max(revno) \
+                        FROM SVNLogDetail GROUP BY changedpathid")
+            # conversion state of each revision. (L)og entry added, (P)ath details added, (D)ummy
+            # entries added, (C)omplete. Revisions which are not complete are removed before
+            # the conversion is resumed.
             cur.execute(
-                "CREATE INDEX IF NOT EXISTS svnpathidx ON SVNPaths (path ASC)")
+                "CREATE TABLE IF NOT EXISTS SVNRevJournal(revno integer PRIMARY KEY, state char)")
+            # diff strategy used for the line counts of each revision i.e. (R)evision level diff,
+            # (F)ile level diffs or (M)ixed. 'mapped' is number of changed files found in the
+            # revision level diff and 'fallback' is number of files which needed file level diffs.
+            cur.execute("CREATE TABLE IF NOT EXISTS SVNDiffStrategy(revno integer PRIMARY KEY, strategy char, \
+                        mapped integer, fallback integer)")
             self.commit()
         # Table structure is changed slightly. I have added a new column in SVNLogDetail table.
         # Use the following sql to alter the old tables
@@ -108,10 +224,62 @@ class SVNLogDB(object):
         # because of some bug in old code sometimes path contains '//' or '.'. Uncomment the line to Fix such paths
         # self.__fixPaths()
 
+    def beginBulkLoad(self, keepindexes=()):
+        '''
+        prepare the database for loading large number of revisions. The secondary indexes (except
+        the ones in 'keepindexes') are dropped and sqlite is set for faster but less safe writes.
+        Call endBulkLoad at the end of the load to create the indexes again.
+        '''
+        self.commit()
+        with closing(self._new_cursor()) as cur:
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=OFF")
+            cur.execute("PRAGMA cache_size=%d" % BULKLOAD_CACHE_SIZE)
+            for indexname, indexsql in BULKLOAD_INDEXES:
+                if(indexname not in keepindexes):
+                    cur.execute("DROP INDEX IF EXISTS %s" % indexname)
+                    self._deferredindexes.add(indexname)
+        self.commit()
+        logging.info("Bulk load started. Deferred indexes : %s" % ','.join(sorted(self._deferredindexes)))
+
+    def endBulkLoad(self):
+        '''
+        create the indexes dropped by beginBulkLoad, update the statistics used by query planner
+        and restore the default sqlite settings.
+        '''
+        self.commit()
+        with closing(self._new_cursor()) as cur:
+            for indexname, indexsql in BULKLOAD_INDEXES:
+                if(indexname in self._deferredindexes):
+                    logging.info("Creating index %s" % indexname)
+                    cur.execute(indexsql)
+            self._deferredindexes.clear()
+            cur.execute("ANALYZE")
+            self.commit()
+            cur.execute("PRAGMA synchronous=FULL")
+            cur.execute("PRAGMA journal_mode=DELETE")
+        logging.info("Bulk load finished.")
+
+    def __createLiveFiles(self, cur):
+        '''
+        fill the SVNLiveFiles table from the existing SVNLogDetail entries (i.e. database created by
+        older version of svnplot)
+        '''
+        cur.execute("INSERT INTO SVNLiveFiles(pathid, path, addrev, delrev) \
+                SELECT DISTINCT changedpathid, SVNPaths.path, AddDetail.revno, \
+                    (SELECT min(DelDetail.revno) FROM SVNLogDetail AS DelDetail \
+                        WHERE DelDetail.changedpathid = AddDetail.changedpathid and DelDetail.pathtype='F' \
+                        and DelDetail.changetype='D' and DelDetail.revno > AddDetail.revno) \
+                FROM SVNLogDetail AS AddDetail, SVNPaths WHERE AddDetail.changedpathid = SVNPaths.id \
+                    and AddDetail.pathtype='F' and (AddDetail.changetype='A' or AddDetail.changetype='R')")
+        if(cur.rowcount > 0):
+            logging.info("Added %d entries in SVNLiveFiles table" % cur.rowcount)
+
     def getLastStoredRev(self):
         '''
         get last revision which stored in the database.
         '''
+        self.flush()
         with closing(self._new_cursor()) as cur:
             cur.execute("select max(revno) from svnlog")
             lastStoreRev = 0
@@ -122,49 +290,190 @@ class SVNLogDB(object):
 
         return(lastStoreRev)
 
+    def _loadPathIds(self):
+        '''
+        load the path ids from SVNPaths table in the memory.
+        '''
+        self._pathids = dict()
+        self._newpaths = []
+        maxid = 0
+        with closing(self._new_cursor()) as cur:
+            cur.execute("SELECT id, path FROM SVNPaths ORDER BY id")
+            for id, path in cur:
+                # if there are duplicate paths, use the first id.
+                self._pathids.setdefault(path, id)
+                maxid = id
+            # ids of deleted paths are not reused (AUTOINCREMENT table).
+            cur.execute("SELECT seq FROM sqlite_sequence WHERE name='SVNPaths'")
+            row = cur.fetchone()
+            if(row != None and row[0] != None):
+                maxid = max(maxid, int(row[0]))
+        self._nextpathid = maxid + 1
+        logging.debug("Loaded %d path ids" % len(self._pathids))
+
+    def _loadNewPathIds(self):
+        '''
+        add the paths inserted in the SVNPaths table by the queries (i.e. not by getFilePathId) to
+        the in memory path id map.
+        '''
+        if(self._pathids is None):
+            self._loadPathIds()
+            return
+        with closing(self._new_cursor()) as cur:
+            cur.execute("SELECT id, path FROM SVNPaths WHERE id >= ? ORDER BY id", (self._nextpathid,))
+            for id, path in cur:
+                self._pathids.setdefault(path, id)
+                self._nextpathid = id + 1
+
     def getFilePathId(self, filepath):
         '''
         File paths are stored in a seperate filepath table for reducing storage size and improve
         query efficiency. Query the file path, get the 'id' for given path.
         Add the filepath to filepath table, if entry is not there.
-        update the filepath id if required.
+        The new paths are added to the table in bulk by flush.
         '''
         id = None
         if(filepath):
-            with closing(self._new_cursor()) as updcur:
-                with closing(self._new_cursor()) as querycur:
-                    querycur.execute(
-                        'select id from SVNPaths where path = ?', (filepath,))
-                    resultrow = querycur.fetchone()
-                    if(resultrow == None):
-                        updcur.execute(
-                            'INSERT INTO SVNPaths(path) values(?)', (filepath,))
-                        querycur.execute(
-                            'select id from SVNPaths where path = ?', (filepath,))
-                        resultrow = querycur.fetchone()
-                    id = resultrow[0]
+            if(self._pathids is None):
+                self._loadPathIds()
+            id = self._pathids.get(filepath)
+            if(id == None):
+                id = self._nextpathid
+                self._nextpathid = id + 1
+                self._pathids[filepath] = id
+                self._newpaths.append((id, filepath))
 
         return(id)
 
+    def flush(self):
+        '''
+        write the buffered new paths, SVNLog and SVNLogDetail rows to the database. Called before
+        the queries which use these tables and before commit.
+        '''
+        if(len(self._newpaths) > 0):
+            self.updcur.executemany(
+                'INSERT INTO SVNPaths(id, path) values(?, ?)', self._newpaths)
+            self._newpaths = []
+        if(len(self._logrows) > 0):
+            self.updcur.executemany("INSERT into SVNLog(revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles, \
+                                authorid) values(?, ?, ?, ?,?, ?, ?, ?)", self._logrows)
+            self._logrows = []
+        if(len(self._detailrows) > 0):
+            self.updcur.executemany("INSERT into SVNLogDetail(revno, changedpathid, changetype, copyfrompathid, copyfromrev, \
+                            linesadded, linesdeleted, lc_updated, pathtype, entrytype) \
+                    values(?, ?, ?, ?,?,?, ?,?,?,?)", self._detailrows)
+            self.__updateLiveFiles(self._detailrows)
+            self.__updatePathLoC(self._detailrows)
+            self._detailrows = []
+        if(len(self._revstates) > 0):
+            self.updcur.executemany("INSERT OR REPLACE INTO SVNRevJournal(revno, state) VALUES(?, ?)",
+                                    sorted(self._revstates.items()))
+            self._revstates = dict()
+        if(len(self._diffstrategies) > 0):
+            self.updcur.executemany("INSERT OR REPLACE INTO SVNDiffStrategy(revno, strategy, mapped, fallback) \
+                                VALUES(?, ?, ?, ?)", [(revno,) + entry for revno, entry in sorted(self._diffstrategies.items())])
+            self._diffstrategies = dict()
+
+    def __updatePathLoC(self, detailrows):
+        '''
+        add the line counts of SVNLogDetail rows to the PathLoC table
+        '''
+        pathloc = dict()
+        for row in detailrows:
+            revno, pathid, linesadded, linesdeleted = row[0], row[1], row[5], row[6]
+            loc, lastrev = pathloc.get(pathid, (0, revno))
+            pathloc[pathid] = (loc + (linesadded or 0) - (linesdeleted or 0), max(lastrev, revno))
+        self.updcur.executemany("INSERT OR IGNORE INTO PathLoC(pathid, loc, lastrev) VALUES(?, 0, ?)",
+                                [(pathid, lastrev) for pathid, (loc, lastrev) in pathloc.items()])
+        self.updcur.executemany("UPDATE PathLoC SET loc=loc+?, lastrev=max(lastrev, ?) WHERE pathid=?",
+                                [(loc, lastrev, pathid) for pathid, (loc, lastrev) in pathloc.items()])
+
+    def __addDummyPathLoC(self, revno, changetype, pathidquery):
+        '''
+        add the line counts of dummy entries of type 'changetype' in the revision to the PathLoC table.
+        pathidquery returns the path ids of the dummy entries.
+        '''
+        self.updcur.execute("INSERT OR IGNORE INTO PathLoC(pathid, loc, lastrev) SELECT pathid, 0, ? \
+                    FROM (%s)" % pathidquery, (revno,))
+        self.updcur.execute("UPDATE PathLoC SET loc=loc+(SELECT total(linesadded) - total(linesdeleted) \
+                    FROM SVNLogDetail WHERE changedpathid=PathLoC.pathid and revno=? and changetype=? \
+                    and entrytype='D'), lastrev=max(lastrev, ?) WHERE pathid IN (%s)" % pathidquery,
+                            (revno, changetype, revno))
+
+    def __updateLiveFiles(self, detailrows):
+        '''
+        update the SVNLiveFiles table for the file additions and deletions in the SVNLogDetail rows
+        '''
+        addedfiles = [(row[0], row[1]) for row in detailrows
+                      if(row[8] == 'F' and (row[2] == 'A' or row[2] == 'R'))]
+        deletedfiles = [(row[0], row[1], row[0], row[0]) for row in detailrows
+                        if(row[8] == 'F' and row[2] == 'D')]
+        self.updcur.executemany("INSERT INTO SVNLiveFiles(pathid, path, addrev) \
+                    SELECT id, path, ? FROM SVNPaths WHERE id=?", addedfiles)
+        # file is deleted in the first deletion after it is added. Hence the order of the rows
+        # doesnot matter.
+        self.updcur.executemany("UPDATE SVNLiveFiles SET delrev=? WHERE pathid=? and addrev < ? \
+                    and (delrev is null or delrev > ?)", deletedfiles)
+
+    def _addDetailRow(self, row):
+        '''
+        buffer a SVNLogDetail row (revno, changedpathid, changetype, copyfrompathid, copyfromrev,
+        linesadded, linesdeleted, lc_updated, pathtype, entrytype)
+        '''
+        self._detailrows.append(row)
+        if(len(self._detailrows) >= self.writebatchsize):
+            self.flush()
+
     def addRevision(self, revlog, addedfiles, changedfiles, deletedfiles):
         '''
         add entry for a new revision in the SVNLog table
         '''
-        self.updcur.execute("INSERT into SVNLog(revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles) \
-                                values(?, ?, ?, ?,?, ?, ?)",
-                            (revlog.revno, revlog.date, revlog.author, revlog.message, addedfiles, changedfiles, deletedfiles))
+        self.addRevisionRow(revlog.revno, revlog.date, revlog.author, revlog.message,
+                            addedfiles, changedfiles, deletedfiles)
+
+    def addRevisionRow(self, revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles):
+        '''
+        add entry for a new revision in the SVNLog table from the column values
+        '''
+        self._logrows.append((revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles,
+                              self.getAuthorId(author)))
+
+    def getAuthorId(self, author):
+        '''
+        Author names are stored in a seperate SVNAuthors table. Query the 'id' of the author and
+        add the author to the table, if entry is not there.
+        '''
+        if(author == None):
+            author = ''
+        id = self._authorids.get(author)
+        if(id == None):
+            with closing(self._new_cursor()) as cur:
+                cur.execute("INSERT OR IGNORE INTO SVNAuthors(name) VALUES(?)", (author,))
+                cur.execute("SELECT id FROM SVNAuthors WHERE name=?", (author,))
+                id = cur.fetchone()[0]
+            self._authorids[author] = id
+        return(id)
 
     def addRevisionDetails(self, revno, change_entry, lc_updated):
         '''
         add the revision details in the SVNlogDetails table
         '''
+        # path type is queried first since directory paths get the trailing '/' with it.
+        pathtype = change_entry.pathtype()
         filename = change_entry.filepath_unicode()
-        changetype = change_entry.change_type()
+        changetype = change_entry.action
         linesadded = change_entry.lc_added()
         linesdeleted = change_entry.lc_deleted()
         copyfrompath, copyfromrev = change_entry.copyfrom()
+        self.addRevisionDetailRow(revno, filename, changetype, copyfrompath, copyfromrev, pathtype,
+                                  linesadded, linesdeleted, lc_updated)
+
+    def addRevisionDetailRow(self, revno, filename, changetype, copyfrompath, copyfromrev, pathtype,
+                             linesadded, linesdeleted, lc_updated):
+        '''
+        add the revision details in the SVNlogDetails table from the column values
+        '''
         entry_type = 'R'  # Real log entry.
-        pathtype = change_entry.pathtype()
         if(pathtype == 'D'):
             assert(filename.endswith('/') == True)
         changepathid = self.getFilePathId(filename)
@@ -172,15 +481,215 @@ class SVNLogDB(object):
         if (changetype == 'R'):
             logging.debug("Replace linecount (revno : %d): %s %d" %
                           (revno, filename, linesadded))
-        self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype, copyfrompathid, copyfromrev, \
-                            linesadded, linesdeleted, lc_updated, pathtype, entrytype) \
-                    values(?, ?, ?, ?,?,?, ?,?,?,?)", (revno, changepathid, changetype, copyfromid, copyfromrev,
-                                                       linesadded, linesdeleted, lc_updated, pathtype, entry_type))
+        if (changetype == 'D' or changetype == 'R'):
+            self.closePathKinds(revno, filename)
+        self._addDetailRow((revno, changepathid, changetype, copyfromid, copyfromrev,
+                            linesadded, linesdeleted, lc_updated, pathtype, entry_type))
+
+    def setRevisionState(self, revno, state):
+        '''
+        record the conversion state of the revision in SVNRevJournal. State is (L)og entry added,
+        (P)ath details added, (D)ummy entries added or (C)omplete.
+        '''
+        assert(state in ('L', 'P', 'D', 'C'))
+        self._revstates[revno] = state
+
+    def setDiffStrategy(self, revno, strategy, mapped, fallback):
+        '''
+        record the diff strategy used for the line counts of the revision in SVNDiffStrategy
+        (see SVNRevLog.diffstrategy)
+        '''
+        assert(strategy in ('R', 'F', 'M'))
+        self._diffstrategies[revno] = (strategy, mapped, fallback)
+
+    def getDiffStrategies(self, fromrevno=0):
+        '''
+        return the (revno, strategy, mapped, fallback) entries of the revisions 'fromrevno' onwards
+        '''
+        self.flush()
+        with closing(self._new_cursor()) as cur:
+            cur.execute("SELECT revno, strategy, mapped, fallback FROM SVNDiffStrategy \
+                        WHERE revno >= ? ORDER BY revno", (fromrevno,))
+            entries = cur.fetchall()
+        return(entries)
+
+    def getFirstIncompleteRev(self, states=('L', 'P', 'D')):
+        '''
+        return the first revision which is not completely converted (e.g. conversion was
+        interrupted after the dummy entries of the revision were committed) and is in one of
+        the given 'states'. Returns None if there is no such revision.
+        '''
+        self.flush()
+        with closing(self._new_cursor()) as cur:
+            cur.execute("SELECT min(revno) FROM SVNRevJournal WHERE state IN (%s)" %
+                        ','.join('?' * len(states)), tuple(states))
+            row = cur.fetchone()
+        return(row[0] if row != None else None)
+
+    def removeRevisions(self, fromrevno):
+        '''
+        remove the entries of revisions 'fromrevno' onwards from all the tables so that these
+        revisions can be converted again.
+        '''
+        self.flush()
+        with closing(self._new_cursor()) as cur:
+            cur.execute("DELETE FROM SVNLog WHERE revno >= ?", (fromrevno,))
+            cur.execute("DELETE FROM SVNLogDetail WHERE revno >= ?", (fromrevno,))
+            cur.execute("DELETE FROM SVNPathKind WHERE fromrev >= ?", (fromrevno,))
+            cur.execute("UPDATE SVNPathKind SET torev=null WHERE torev >= ?", (fromrevno,))
+            cur.execute("DELETE FROM SVNRevJournal WHERE revno >= ?", (fromrevno,))
+            cur.execute("DELETE FROM SVNDiffStrategy WHERE revno >= ?", (fromrevno,))
+            self.__resetFileTables(cur, fromrevno)
+        logging.info("Removed the entries of revisions %d onwards" % fromrevno)
+
+    def __resetFileTables(self, cur, fromrevno):
+        '''
+        set the SVNLiveFiles and PathLoC tables to the state before the revision 'fromrevno'
+        '''
+        cur.execute("DELETE FROM SVNLiveFiles WHERE addrev >= ?", (fromrevno,))
+        cur.execute("UPDATE SVNLiveFiles SET delrev=null WHERE delrev >= ?", (fromrevno,))
+        cur.execute("UPDATE PathLoC SET \
+                loc=(SELECT total(linesadded) - total(linesdeleted) FROM SVNLogDetail \
+                    WHERE changedpathid=PathLoC.pathid and revno < ?), \
+                lastrev=(SELECT max(revno) FROM SVNLogDetail \
+                    WHERE changedpathid=PathLoC.pathid and revno < ?) \
+                WHERE lastrev >= ?", (fromrevno, fromrevno, fromrevno))
+        cur.execute("DELETE FROM PathLoC WHERE lastrev is null")
+
+    def prepareLineCountUpdate(self):
+        '''
+        prepare for updating the line counts of the revisions converted without line count. Line
+        counts of the files copied/deleted with a directory (i.e. dummy entries) and the file
+        tables depend on the line counts of earlier revisions. Hence these are generated again
+        for all the revisions from the first revision without line count. These revisions are
+        marked as (P)ath details added in the revision journal till they are updated.
+        Returns the first revision to be updated (None if line counts of all revisions are updated).
+        '''
+        self.flush()
+        with closing(self._new_cursor()) as cur:
+            cur.execute("SELECT min(revno) FROM SVNLogDetail WHERE lc_updated='N'")
+            fromrevno = cur.fetchone()[0]
+            # line count update interrupted earlier.
+            journalrev = self.getFirstIncompleteRev(states=('P', 'D'))
+            if(fromrevno == None or (journalrev != None and journalrev < fromrevno)):
+                fromrevno = journalrev
+            if(fromrevno != None):
+                cur.execute("DELETE FROM SVNLogDetail WHERE revno >= ? and entrytype='D'", (fromrevno,))
+                self.__resetFileTables(cur, fromrevno)
+                cur.execute("INSERT OR REPLACE INTO SVNRevJournal(revno, state) \
+                        SELECT revno, 'P' FROM SVNLog WHERE revno >= ?", (fromrevno,))
+        self.commit()
+        return(fromrevno)
+
+    def getRevsLineCountNotUpdated(self):
+        '''
+        return list of revision numbers where line count is not updated yet.
+        '''
+        self.flush()
+        with closing(self._new_cursor()) as cur:
+            cur.execute(
+                "SELECT DISTINCT revno FROM SVNLogDetail WHERE lc_updated='N' ORDER BY revno")
+            revlist = [row[0] for row in cur]
+        return(revlist)
+
+    def updateLineCounts(self, revno, linecounts):
+        '''
+        update the line counts of the 'real' log detail entries of the revision. linecounts is
+        list of (linesadded, linesdeleted, changedpathid).
+        '''
+        self.updcur.executemany("UPDATE SVNLogDetail SET linesadded=?, linesdeleted=?, lc_updated='Y' \
+                    WHERE revno=? and changedpathid=? and entrytype='R'",
+                                [(linesadded, linesdeleted, revno, pathid)
+                                 for linesadded, linesdeleted, pathid in linecounts])
+        self.updcur.execute("UPDATE SVNLogDetail SET lc_updated='Y' WHERE revno=? and entrytype='R'",
+                            (revno,))
+
+    def updateFileTables(self, revno):
+        '''
+        update the SVNLiveFiles and PathLoC tables for the 'real' log detail entries of the
+        revision already stored in the database (see prepareLineCountUpdate)
+        '''
+        self.flush()
+        self.updcur.execute("INSERT INTO SVNLiveFiles(pathid, path, addrev) \
+                SELECT changedpathid, SVNPaths.path, revno FROM SVNLogDetail, SVNPaths \
+                WHERE SVNPaths.id=changedpathid and revno=? and entrytype='R' and pathtype='F' \
+                    and (changetype='A' or changetype='R')", (revno,))
+        self.updcur.execute("UPDATE SVNLiveFiles SET delrev=? WHERE addrev < ? and (delrev is null or delrev > ?) \
+                and pathid IN (SELECT changedpathid FROM SVNLogDetail WHERE revno=? and entrytype='R' \
+                    and pathtype='F' and changetype='D')", (revno, revno, revno, revno))
+        pathidquery = "SELECT changedpathid AS pathid FROM SVNLogDetail WHERE revno=%d and entrytype='R'" % revno
+        self.updcur.execute("INSERT OR IGNORE INTO PathLoC(pathid, loc, lastrev) SELECT pathid, 0, ? \
+                    FROM (%s)" % pathidquery, (revno,))
+        self.updcur.execute("UPDATE PathLoC SET loc=loc+(SELECT total(linesadded) - total(linesdeleted) \
+                    FROM SVNLogDetail WHERE changedpathid=PathLoC.pathid and revno=? and entrytype='R'), \
+                    lastrev=max(lastrev, ?) WHERE pathid IN (%s)" % pathidquery, (revno, revno))
+
+    def getPathKinds(self, validonly=True):
+        '''
+        return the path type entries (path, fromrev, torev, pathtype) which are valid till the
+        last stored revision. If validonly is False, all the entries are returned.
+        '''
+        sqlquery = "SELECT path, fromrev, torev, pathtype FROM SVNPathKind"
+        if(validonly == True):
+            sqlquery = sqlquery + " WHERE torev is null"
+        with closing(self._new_cursor()) as cur:
+            cur.execute(sqlquery)
+            for row in cur:
+                yield row
+
+    def getRevisionEntries(self, fromrevno=0, torevno=None):
+        '''
+        return the stored revisions (from 'fromrevno' to 'torevno') in the revision order. Each
+        revision is returned as the SVNLog row (revno, commitdate, author, msg, addedfiles,
+        changedfiles, deletedfiles) and the list of its 'real' log detail rows (changedpath,
+        changetype, copyfrompath, copyfromrev, pathtype, linesadded, linesdeleted, lc_updated)
+        '''
+        self.flush()
+        if(torevno == None):
+            torevno = self.getLastStoredRev()
+        with closing(self._new_cursor()) as logcur:
+            with closing(self._new_cursor()) as dtlcur:
+                logcur.execute("SELECT revno, commitdate, author, msg, addedfiles, changedfiles, deletedfiles \
+                        FROM SVNLog WHERE revno >= ? and revno <= ? ORDER BY revno", (fromrevno, torevno))
+                dtlcur.execute("SELECT revno, changedpath, changetype, copyfrompath, copyfromrev, pathtype, \
+                        linesadded, linesdeleted, lc_updated FROM SVNLogDetailVw WHERE entrytype='R' \
+                        and revno >= ? and revno <= ? ORDER BY revno", (fromrevno, torevno))
+                dtlrow = dtlcur.fetchone()
+                for logrow in logcur:
+                    revno = logrow[0]
+                    details = []
+                    while(dtlrow != None and dtlrow[0] <= revno):
+                        if(dtlrow[0] == revno):
+                            details.append(dtlrow[1:])
+                        dtlrow = dtlcur.fetchone()
+                    yield logrow, details
+
+    def addPathKinds(self, entries):
+        '''
+        add the path type entries (path, fromrev, torev, pathtype) queried from the repository
+        '''
+        self.updcur.executemany("INSERT INTO SVNPathKind(path, fromrev, torev, pathtype) \
+                    VALUES(?,?,?,?)", entries)
+
+    def closePathKinds(self, revno, path):
+        '''
+        path (and all the paths under it) are deleted or replaced in the revision 'revno'. Hence
+        the path types entries valid till now are not valid from this revision onwards.
+        '''
+        path = path.rstrip('/')
+        dirstart, dirend = dirpathrange(path)
+        self.updcur.execute("UPDATE SVNPathKind SET torev=? WHERE torev is null and fromrev < ? \
+                    and (path=? or (path > ? and path < ?))", (revno, revno, path, dirstart, dirend))
 
     def updateNumFiles(self, revno, addedfiles, deletedfiles):
         '''
         update the added/deleted files count for a given revision
         '''
+        for idx, row in enumerate(self._logrows):
+            if(row[0] == revno):
+                # revision is not written to database yet. update the buffered row.
+                self._logrows[idx] = row[:4] + (addedfiles, row[5], deletedfiles) + row[7:]
+                return
         self.updcur.execute("UPDATE SVNLog SET addedfiles=?, deletedfiles=? where revno=?",
                             (addedfiles, deletedfiles, revno))
 
@@ -189,117 +698,94 @@ class SVNLogDB(object):
         create the file list for a revision in a temporary table.
         '''
         assert(dirname.endswith('/'))
+        self.flush()
         self.updcur.execute('DROP TABLE IF EXISTS TempRevDirFileList')
         self.updcur.execute('DROP VIEW IF EXISTS TempRevDirFileListVw')
         self.updcur.execute(
             'CREATE TEMP TABLE TempRevDirFileList(path text, pathid integer, addrevno integer)')
         self.updcur.execute(
-            'CREATE INDEX revdirfilelistidx ON TempRevDirFileList (addrevno ASC, path ASC)')
-        sqlquery = 'SELECT DISTINCT SVNPaths.path, changedpathid, SVNLogDetail.revno FROM SVNLogDetail,SVNPaths WHERE \
-                    pathtype="F" and SVNLogDetail.revno <=%d and (changetype== "A" or changetype== "R") \
-                    and SVNLogDetail.changedpathid = SVNPaths.id and \
-                    (SVNPaths.path like "%s%%" and SVNPaths.path != "%s")' \
-                    % (revno, dirname, dirname)
-
-        with closing(self._new_cursor()) as querycur:
-            querycur.execute(sqlquery)
-            for sourcepath, sourcepathid, addrevno in querycur:
-                self.updcur.execute('INSERT INTO TempRevDirFileList(path, pathid, addrevno) \
-                            VALUES(?,?,?)', (sourcepath, sourcepathid, addrevno))
-            self.commit()
-
-            # Now delete the already deleted files from the file list.
-            sqlquery = 'SELECT DISTINCT SVNPaths.path, SVNLogDetail.changedpathid, SVNLogDetail.revno FROM SVNLogDetail,SVNPaths \
-                       WHERE pathtype="F" and SVNLogDetail.revno <=%d and changetype== "D" \
-                       and SVNLogDetail.changedpathid = SVNPaths.id \
-                        and (SVNPaths.path like "%s%%" and SVNPaths.path!= "%s")' \
-                        % (revno, dirname, dirname)
-            querycur.execute(sqlquery)
-            for sourcepath, sourcepathid, delrevno in querycur:
-                self.updcur.execute(
-                    'DELETE FROM TempRevDirFileList WHERE path=? and addrevno < ?', (sourcepath, delrevno))
-
-            # in rare case there is a possibility of duplicate values in the TempRevFileList
-            # hence try to create a temporary view to get the unique values
-            self.updcur.execute('CREATE TEMP VIEW TempRevDirFileListVw AS SELECT DISTINCT \
-                path, pathid, addrevno FROM TempRevDirFileList')
-            self.commit()
+            'CREATE INDEX revdirfilelistidx ON TempRevDirFileList (pathid ASC, addrevno ASC)')
+        dirstart, dirend = dirpathrange(dirname)
+        self.updcur.execute('INSERT INTO TempRevDirFileList(path, pathid, addrevno) \
+                    SELECT DISTINCT path, pathid, addrev FROM SVNLiveFiles \
+                    WHERE path > ? and path < ? and addrev <= ? and (delrev is null or delrev > ?)',
+                            (dirstart, dirend, revno, revno))
+
+        # in rare case there is a possibility of duplicate values in the TempRevFileList
+        # hence try to create a temporary view to get the unique values
+        self.updcur.execute('CREATE TEMP VIEW TempRevDirFileListVw AS SELECT DISTINCT \
+            path, pathid, addrevno FROM TempRevDirFileList')
+        self.commit()
 
-    def createRevFileList(self, revlog, copied_dirlist, deleted_dirlist):
+    def createRevFileList(self, filepaths, copied_dirlist, deleted_dirlist):
         '''
         create the file list for a revision for a specific directory in a temporary table.
+        filepaths - paths of the files changed in the revision ('real' entries)
+        copied_dirlist - list of (path, copyfrompath, copyfromrev) of the copied directories
+        deleted_dirlist - list of paths of deleted directories
+        returns the deleted directories which are not part of the copied directories.
         '''
         try:
             upd_del_dirlist = deleted_dirlist
+            self.flush()
             self.updcur.execute('DROP TABLE IF EXISTS TempRevFileList')
+            self.updcur.execute('DROP TABLE IF EXISTS TempRevCopiedFiles')
             self.updcur.execute('DROP VIEW IF EXISTS TempRevFileListVw')
-            self.updcur.execute('CREATE TEMP TABLE TempRevFileList(path text, addrevno integer, \
+            # files of the copied directories are collected in TempRevCopiedFiles and copied to
+            # TempRevFileList along with their path ids.
+            self.updcur.execute('CREATE TEMP TABLE TempRevCopiedFiles(path text, addrevno integer, \
                         copyfrom_path text, copyfrom_pathid integer, copyfrom_rev integer)')
             self.updcur.execute(
-                'CREATE INDEX revfilelistidx ON TempRevFileList (addrevno ASC, path ASC)')
+                'CREATE INDEX revcopiedfilesidx ON TempRevCopiedFiles (path ASC, addrevno ASC)')
+            self.updcur.execute('CREATE TEMP TABLE TempRevFileList(path text, pathid integer, addrevno integer, \
+                        copyfrom_path text, copyfrom_pathid integer, copyfrom_rev integer)')
 
+            for copied_path, copiedfrom_path, copiedfrom_rev in copied_dirlist:
+                # collect all files added to this directory.
+                assert(copiedfrom_path.endswith('/') == copied_path.endswith('/'))
+                dirstart, dirend = dirpathrange(copiedfrom_path)
+                # path of the copied file is the copied directory path + path relative to source directory
+                self.updcur.execute('INSERT INTO TempRevCopiedFiles(path, addrevno, copyfrom_path, copyfrom_pathid, copyfrom_rev) \
+                    SELECT DISTINCT ? || substr(path, length(?)+1), addrev, path, pathid, ? FROM SVNLiveFiles \
+                    WHERE path > ? and path < ? and addrev <= ? and (delrev is null or delrev > ?)',
+                                    (copied_path, copiedfrom_path, copiedfrom_rev,
+                                     dirstart, dirend, copiedfrom_rev, copiedfrom_rev))
+
+            # Now delete the entries for which 'real' entry is already created in
+            # this 'revision' update.
+            self.updcur.executemany('DELETE FROM TempRevCopiedFiles WHERE path=?',
+                                    [(filepath,) for filepath in filepaths])
+
+            upd_del_dirlist = []
             with closing(self._new_cursor()) as querycur:
-                for change in copied_dirlist:
-                    copiedfrom_path, copiedfrom_rev = change.copyfrom()
-                    # collect all files added to this directory.
-                    assert(copiedfrom_path.endswith('/') ==
-                           change.filepath_unicode().endswith('/'))
-
-                    sqlquery = 'SELECT DISTINCT SVNPaths.path, changedpathid, revno FROM SVNLogDetail, SVNPaths \
-                        WHERE pathtype="F" and revno <=%d and (changetype== "A" or changetype== "R") and \
-                        SVNPaths.id = SVNLogDetail.changedpathid and \
-                        (SVNPaths.path like "%s%%" and SVNPaths.path!= "%s") \
-                        ' % (copiedfrom_rev, copiedfrom_path, copiedfrom_path)
-                    querycur.execute(sqlquery)
-                    for sourcepath, sourcepathid, addrevno in querycur:
-                        path = sourcepath.replace(
-                            copiedfrom_path, change.filepath_unicode())
-                        self.updcur.execute('INSERT INTO TempRevFileList(path, addrevno, copyfrom_path, copyfrom_pathid,copyfrom_rev) \
-                            VALUES(?,?,?,?,?)', (path, addrevno, sourcepath, sourcepathid, copiedfrom_rev))
-                self.commit()
-
-                # Now delete the already deleted files from the file list.
-                for change in copied_dirlist:
-                    copiedfrom_path, copiedfrom_rev = change.copyfrom()
-                    sqlquery = 'SELECT DISTINCT SVNPaths.path, changedpathid, revno FROM SVNLogDetail,SVNPaths WHERE \
-                        pathtype="F" and revno <=%d and changetype== "D" and \
-                        SVNPaths.id = SVNLogDetail.changedpathid and \
-                        (SVNPaths.path like "%s%%" and SVNPaths.path != "%s")' % (copiedfrom_rev, copiedfrom_path, copiedfrom_path)
-                    querycur.execute(sqlquery)
-                    for sourcepath, sourcepathid, delrevno in querycur:
-                        path = sourcepath.replace(
-                            copiedfrom_path, change.filepath_unicode())
-                        self.updcur.execute(
-                            'DELETE FROM TempRevFileList WHERE path=? and addrevno < ?', (path, delrevno))
-
-                self.commit()
-
-                # Now delete the entries for which 'real' entry is already created in
-                # this 'revision' update.
-                for change_entry in revlog.getFileChangeEntries():
-                    filepath = change_entry.filepath()
-                    self.updcur.execute(
-                        'DELETE FROM TempRevFileList WHERE path=?', (filepath,))
-
-                upd_del_dirlist = []
-                for change in deleted_dirlist:
+                for deleted_dir in deleted_dirlist:
                     # first check if 'deleted' directory entry is there in the revision filelist
                     # if yes, remove those rows.
+                    dirstart, dirend = dirpathrange(deleted_dir)
                     querycur.execute(
-                        'SELECT count(*) FROM TempRevFileList WHERE path like "%s%%"' % change.filepath())
+                        'SELECT count(*) FROM TempRevCopiedFiles WHERE path > ? and path < ?', (dirstart, dirend))
                     count = int(querycur.fetchone()[0])
                     if(count > 0):
                         self.updcur.execute(
-                            'DELETE FROM TempRevFileList WHERE path like "%s%%"' % change.filepath())
+                            'DELETE FROM TempRevCopiedFiles WHERE path > ? and path < ?', (dirstart, dirend))
                     else:
                         # if deletion path is not there in the addition path, it has to be
                         # handled seperately. Hence add it into different list
-                        upd_del_dirlist.append(change)
+                        upd_del_dirlist.append(deleted_dir)
+
+            # add the paths not in SVNPaths yet and get the path ids with a join.
+            self.updcur.execute('INSERT INTO SVNPaths(path) SELECT DISTINCT path FROM TempRevCopiedFiles \
+                WHERE NOT EXISTS (SELECT 1 FROM SVNPaths WHERE SVNPaths.path=TempRevCopiedFiles.path)')
+            self._loadNewPathIds()
+            self.updcur.execute('INSERT INTO TempRevFileList(path, pathid, addrevno, copyfrom_path, copyfrom_pathid, copyfrom_rev) \
+                SELECT TempRevCopiedFiles.path, min(SVNPaths.id), addrevno, copyfrom_path, copyfrom_pathid, copyfrom_rev \
+                FROM TempRevCopiedFiles, SVNPaths WHERE SVNPaths.path=TempRevCopiedFiles.path \
+                GROUP BY TempRevCopiedFiles.rowid')
 
             # in rare case there is a possibility of duplicate values in the TempRevFileList
             # hence try to create a temporary view to get the unique values
             self.updcur.execute('CREATE TEMP VIEW TempRevFileListVw AS SELECT DISTINCT \
-                path, addrevno, copyfrom_path, copyfrom_pathid,copyfrom_rev FROM TempRevFileList \
+                path, pathid, addrevno, copyfrom_path, copyfrom_pathid,copyfrom_rev FROM TempRevFileList \
                 group by path having addrevno=max(addrevno)')
 
             self.commit()
@@ -310,61 +796,63 @@ class SVNLogDB(object):
 
         return(upd_del_dirlist)
 
+    def _createPathLoCTable(self, pathrevquery, params=()):
+        '''
+        create a temporary table TempPathLoC(pathid, uptorev, loc) with the line count of the paths
+        in revision 'uptorev'. pathrevquery should return the (pathid, uptorev) pairs.
+        '''
+        self.updcur.execute('DROP TABLE IF EXISTS TempPathRev')
+        self.updcur.execute('DROP TABLE IF EXISTS TempPathLoC')
+        self.updcur.execute('CREATE TEMP TABLE TempPathRev AS %s' % pathrevquery, params)
+        self.updcur.execute(
+            'CREATE TEMP TABLE TempPathLoC(pathid integer, uptorev integer, loc integer)')
+        # use the current line count if path is not modified after 'uptorev'
+        self.updcur.execute('INSERT INTO TempPathLoC(pathid, uptorev, loc) \
+                SELECT TempPathRev.pathid, uptorev, loc FROM TempPathRev, PathLoC \
+                WHERE PathLoC.pathid = TempPathRev.pathid and lastrev <= uptorev')
+        # otherwise calculate the line count from the history of the path.
+        self.updcur.execute('INSERT INTO TempPathLoC(pathid, uptorev, loc) \
+                SELECT TempPathRev.pathid, uptorev, sum(linesadded) - sum(linesdeleted) \
+                FROM TempPathRev, SVNLogDetail WHERE SVNLogDetail.changedpathid = TempPathRev.pathid \
+                and SVNLogDetail.revno <= uptorev and NOT EXISTS (SELECT * FROM PathLoC \
+                    WHERE PathLoC.pathid = TempPathRev.pathid and lastrev <= uptorev) \
+                GROUP BY TempPathRev.pathid, uptorev')
+        self.updcur.execute(
+            'CREATE INDEX temppathlocidx ON TempPathLoC (pathid ASC, uptorev ASC)')
+
     def addDummyAdditionDetails(self, revno):
         addedfiles = 0
-        path_type = 'F'
-        changetype = 'A'
-        entry_type = 'D'
-        lc_updated = 'Y'
-        total_lc_added = 0
+        self.flush()
 
         with closing(self._new_cursor()) as querycur:
             querycur.execute("SELECT count(*) from TempRevFileListVw")
-            logging.debug("Revision file count = %d" % querycur.fetchone()[0])
-
-            querycur.execute("SELECT * from TempRevFileListVw")
-            for changedpath, addrevno, copyfrompath, copyfrompathid, copyfromrev in querycur.fetchall():
-                querycur.execute("select sum(linesadded), sum(linesdeleted) from SVNLogDetail \
-                        where revno <= ? and changedpathid ==(select id from SVNPaths where path== ?) group by changedpathid",
-                                 (copyfromrev, copyfrompath))
-
-                row = querycur.fetchone()
-                # set lines added to current line count
-                lc_added = 0
-                if row is not None:
-                    lc_added = row[0] - row[1]
-
-                if(lc_added < 0):
-                    logging.error(
-                        "Found negative linecount for %s(rev %d)" % (copyfrompath, copyfromrev))
-                    lc_added = 0
-                # set the lines deleted = 0
-                lc_deleted = 0
-
-                total_lc_added = total_lc_added + lc_added
-                #logging.debug("\tadded dummy addition entry for path %s linecount=%d" % (changedpath,lc_added))
-                changedpathid = self.getFilePathId(changedpath)
-                copyfrompathid = self.getFilePathId(copyfrompath)
-                assert(path_type != 'U')
-                self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype, copyfrompathid, copyfromrev, \
-                                        linesadded, linesdeleted, entrytype, pathtype, lc_updated) \
-                                values(?, ?, ?, ?,?,?, ?,?,?,?)", (revno, changedpathid, changetype, copyfrompathid, copyfromrev,
-                                                                   lc_added, lc_deleted, entry_type, path_type, lc_updated))
-                addedfiles = addedfiles + 1
+            addedfiles = querycur.fetchone()[0]
+            logging.debug("Revision file count = %d" % addedfiles)
+
+            # line count of copied file is the line count of the source file in the source revision
+            self._createPathLoCTable(
+                'SELECT DISTINCT copyfrom_pathid AS pathid, copyfrom_rev AS uptorev FROM TempRevFileListVw')
+            querycur.execute("SELECT copyfrom_path, copyfrom_rev FROM TempRevFileListVw, TempPathLoC \
+                    WHERE TempPathLoC.pathid = copyfrom_pathid and uptorev = copyfrom_rev and loc < 0")
+            for copyfrompath, copyfromrev in querycur.fetchall():
+                logging.error(
+                    "Found negative linecount for %s(rev %d)" % (copyfrompath, copyfromrev))
+
+            # set lines added to current line count and lines deleted = 0
+            self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype, copyfrompathid, copyfromrev, \
+                                linesadded, linesdeleted, lc_updated, pathtype, entrytype) \
+                    SELECT ?, TempRevFileListVw.pathid, 'A', copyfrom_pathid, copyfrom_rev, max(ifnull(loc, 0), 0), 0, \
+                    'Y', 'F', 'D' FROM TempRevFileListVw LEFT JOIN TempPathLoC ON \
+                    TempPathLoC.pathid = copyfrom_pathid and uptorev = copyfrom_rev", (revno,))
+            self.updcur.execute("INSERT INTO SVNLiveFiles(pathid, path, addrev) \
+                    SELECT DISTINCT pathid, path, ? FROM TempRevFileListVw", (revno,))
+            self.__addDummyPathLoC(revno, 'A', 'SELECT DISTINCT pathid FROM TempRevFileListVw')
             # Now commit the changes
             self.commit()
-        logging.debug("\t Total dummy line count : %d" % total_lc_added)
         return addedfiles
 
     def addDummyDeletionDetails(self, revno, deleted_dir):
         deletedfiles = 0
-        addedfiles = 0
-        path_type = 'F'
-        # set lines added to 0
-        lc_added = 0
-        changetype = 'D'
-        entry_type = 'D'
-        lc_updated = 'Y'
 
         assert(deleted_dir.endswith('/'))
         # now query the deleted folders from the sqlite database and get the
@@ -374,49 +862,66 @@ class SVNLogDB(object):
         self.createRevFileListForDir(revno, deleted_dir)
 
         with closing(self._new_cursor()) as querycur:
-            querycur.execute('SELECT path FROM TempRevDirFileListVw')
+            querycur.execute('SELECT count(*) FROM TempRevDirFileListVw')
+            deletedfiles = querycur.fetchone()[0]
+
+            self._createPathLoCTable(
+                'SELECT DISTINCT pathid, ? AS uptorev FROM TempRevDirFileListVw', (revno,))
+            querycur.execute('SELECT DISTINCT path FROM TempRevDirFileListVw, TempPathLoC \
+                    WHERE TempPathLoC.pathid = TempRevDirFileListVw.pathid and loc < 0')
             for changedpath, in querycur.fetchall():
-                #logging.debug("\tDummy file deletion entries for path %s" % changedpath)
-                querycur.execute('select sum(linesadded), sum(linesdeleted)  from SVNLogDetail \
-                        where revno <= ? and changedpathid ==(select id from SVNPaths where path== ?) group by changedpathid',
-                                 (revno, changedpath))
-
-                row = querycur.fetchone()
-                lc_deleted = 0
-                if row != None:
-                    # set lines deleted to current line count
-                    lc_deleted = row[0] - row[1]
-                if(lc_deleted < 0):
-                    logging.error(
-                        "Found negative linecount for %s(rev %d)" % (changedpath, revno))
-                    lc_deleted = 0
-
-                changedpathid = self.getFilePathId(changedpath)
-                self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype,  \
-                                        linesadded, linesdeleted, entrytype, pathtype, lc_updated) \
-                                values(?, ?,?,?, ?,?,?,?)", (revno, changedpathid, changetype,
-                                                             lc_added, lc_deleted, entry_type, path_type, lc_updated))
-                deletedfiles = deletedfiles + 1
+                logging.error(
+                    "Found negative linecount for %s(rev %d)" % (changedpath, revno))
+
+            # set lines added to 0 and lines deleted to current line count
+            self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype, \
+                                linesadded, linesdeleted, lc_updated, pathtype, entrytype) \
+                    SELECT ?, PathList.pathid, 'D', 0, max(ifnull(loc, 0), 0), 'Y', 'F', 'D' \
+                    FROM (SELECT DISTINCT pathid FROM TempRevDirFileListVw) AS PathList \
+                    LEFT JOIN TempPathLoC ON TempPathLoC.pathid = PathList.pathid", (revno,))
+            # if path is repeated in the file list (e.g. replaced file), all its lines are already
+            # deleted by the first entry.
+            self.updcur.execute("INSERT into SVNLogDetail(revno, changedpathid, changetype, \
+                                linesadded, linesdeleted, lc_updated, pathtype, entrytype) \
+                    SELECT ?, pathid, 'D', 0, 0, 'Y', 'F', 'D' FROM TempRevDirFileListVw \
+                    WHERE addrevno > (SELECT min(addrevno) FROM TempRevDirFileList \
+                        WHERE TempRevDirFileList.pathid = TempRevDirFileListVw.pathid)", (revno,))
+            self.updcur.execute("UPDATE SVNLiveFiles SET delrev=? WHERE addrev < ? and (delrev is null or delrev > ?) \
+                    and pathid IN (SELECT pathid FROM TempRevDirFileListVw)", (revno, revno, revno))
+            self.__addDummyPathLoC(revno, 'D', 'SELECT DISTINCT pathid FROM TempRevDirFileListVw')
             self.commit()
         return deletedfiles
 
-    def getRevsLineCountNotUpdated(self):
+    def addDummyEntries(self, revno, filepaths, copied_dirlist, deleted_dirlist):
         '''
-        return list of revision numbers where line count is not updated yet.
+        add dummy log detail entries for getting the correct line count data in case of
+        tagging/branching and deleting the directories. Arguments are same as createRevFileList.
+        returns the number of files added and deleted by the dummy entries.
         '''
-        with closing(self._new_cursor()) as cur:
-            cur.execute("CREATE TEMP TABLE IF NOT EXISTS LCUpdateStatus \
-                        as select revno, changedpath, changetype from SVNLogDetail where lc_updated='N'")
-            self.commit()
-            cur.execute(
-                "select revno, changedpath, changetype from LCUpdateStatus")
-
-            yield cur.fetchone()
+        addedfiles = 0
+        deletedfiles = 0
 
-    def updateLineCount(self, revno, changedpath, linesadded, linesdeleted):
-        sqlquery = "Update SVNLogDetail Set linesadded=%d, linesdeleted=%d, lc_updated='Y' \
-                    where revno=%d and changedpath='%s'" % (linesadded, linesdeleted, revno, changedpath)
-        self.updcur.execute(sqlquery)
+        if(len(copied_dirlist) > 0 or len(deleted_dirlist) > 0):
+            # since we may have to query the existing data. Commit the changes
+            # first.
+            self.commit()
+            # Now create list of file names for adding dummy entries. There is
+            # no  need to add dummy entries for directories.
+            if(len(copied_dirlist) > 0):
+                # now update the additions
+                # Path type is directory then dummy entries are required.
+                # For file type, 'real' entries will get creaetd
+                logging.debug("Adding dummy file addition entries")
+                deleted_dirlist = self.createRevFileList(
+                    filepaths, copied_dirlist, deleted_dirlist)
+                addedfiles = self.addDummyAdditionDetails(revno)
+            if len(deleted_dirlist) > 0:
+                logging.debug("Adding dummy file deletion entries")
+                for deleted_dir in deleted_dirlist:
+                    deletedfiles = deletedfiles + \
+                        self.addDummyDeletionDetails(revno, deleted_dir)
+
+        return(addedfiles, deletedfiles)
 
     def _connect(self):
         '''
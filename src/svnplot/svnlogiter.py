@@ -19,8 +19,12 @@ import time
 import os
 import re
 import string
+import sys
+import threading
+import collections
 
 from six.moves import urllib
+from six.moves import queue
    
 import getpass
 import tempfile
@@ -31,15 +35,27 @@ from .svnlogclient import *
 from .util import *
 
 
+# svn log of a revision block is fetched in about these many seconds by adjusting the number
+# of revisions fetched in one call (i.e. block size) between the minimum and maximum block sizes.
+LOG_BLOCK_SECONDS = 2.0
+LOG_BLOCK_MINSIZE = 10
+LOG_BLOCK_MAXSIZE = 1000
+# file level diffs are used if a revision adds/deletes more files than this.
+REVDIFF_MAXFILES = 200
+
+
 class SVNRevLogIter(object):
 
-    def __init__(self, logclient, startRevNo, endRevNo, cachesize=50, bUseFileDiff=False):
+    def __init__(self, logclient, startRevNo, endRevNo, cachesize=50, bUseFileDiff=False, prefetch=2):
         self.logclient = logclient
         self.startrev = startRevNo
         self.endrev = endRevNo
         self.revlogcache = None
         self.cachesize = cachesize
         self.bUseFileDiff = bUseFileDiff
+        # number of log blocks fetched in a background thread ahead of the caller. 0 fetches
+        # the next block only after the current block is processed.
+        self.prefetch = prefetch
 
     def __iter__(self):
         return(self.next())
@@ -50,47 +66,263 @@ class SVNRevLogIter(object):
         if(self.startrev == 0):
             self.startrev = self.endrev
 
-        while (self.startrev <= self.endrev):
-            logging.info("updating logs %d to %d" %
-                         (self.startrev, self.endrev))
-            self.revlogcache = self.logclient.getLogs(self.startrev, self.endrev,
-                                                      cachesize=self.cachesize, detailedLog=True)
-            if(self.revlogcache == None or len(self.revlogcache) == 0):
-                raise StopIteration
+        if(self.prefetch > 0):
+            logblocks = self.__prefetchLogBlocks()
+        else:
+            logblocks = self.__iterLogBlocks(self.logclient)
 
-            self.startrev = self.revlogcache[-1].revision.number + 1
+        for revlogcache in logblocks:
+            self.revlogcache = revlogcache
             for revlog in self.revlogcache:
                 # since reach revision log entry is a dictionary. If the dictionary is empty
                 # then log is not available or its end of log entries
                 if(len(revlog) == 0):
-                    raise StopIteration
+                    return
                 svnrevlog = SVNRevLog(
                     self.logclient, revlog, self.bUseFileDiff)
+                if(self.logclient.pathhistory is not None):
+                    # record the deletions/replacements before the revision is processed.
+                    self.logclient.pathhistory.addRevision(
+                        svnrevlog.revno, revlog.changed_paths)
                 yield svnrevlog
 
+    def __iterLogBlocks(self, logclient):
+        '''
+        fetch the revision logs in blocks of 'cachesize' revisions. The block size is adjusted so
+        that one block is fetched in about LOG_BLOCK_SECONDS.
+        '''
+        while (self.startrev <= self.endrev):
+            logging.info("updating logs %d to %d" %
+                         (self.startrev, self.endrev))
+            starttime = time.time()
+            revlogcache = logclient.getLogs(self.startrev, self.endrev,
+                                            cachesize=self.cachesize, detailedLog=True)
+            if(revlogcache == None or len(revlogcache) == 0):
+                break
+            self.startrev = revlogcache[-1].revision.number + 1
+            if(len(revlogcache) >= self.cachesize):
+                self.__updateCacheSize(time.time() - starttime)
+            yield revlogcache
+
+    def __updateCacheSize(self, elapsed):
+        cachesize = self.cachesize
+        if(elapsed < LOG_BLOCK_SECONDS / 2):
+            cachesize = min(cachesize * 2, LOG_BLOCK_MAXSIZE)
+        elif(elapsed > LOG_BLOCK_SECONDS * 2):
+            cachesize = max(cachesize // 2, LOG_BLOCK_MINSIZE)
+        if(cachesize != self.cachesize):
+            logging.debug("log block size changed to %d (%.2f sec for %d revisions)" % (
+                cachesize, elapsed, self.cachesize))
+            self.cachesize = cachesize
+
+    def __prefetchLogBlocks(self):
+        '''
+        fetch the log blocks in a background thread (with a pooled log client) so that next
+        blocks are already available when the caller finishes processing current block.
+        '''
+        blockqueue = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        fetcher = threading.Thread(target=self.__fetchLogBlocks, args=(blockqueue, stop),
+                                   name="svnlogprefetch")
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            while True:
+                # time waiting for the repository (i.e. prefetch is not fast enough)
+                with self.logclient.timers.measure('logwait'):
+                    revlogcache, error = blockqueue.get()
+                if(error is not None):
+                    six.reraise(*error)
+                if(revlogcache is None):
+                    break
+                yield revlogcache
+        finally:
+            # if the caller stopped early, stop the fetcher thread.
+            stop.set()
+
+    def __fetchLogBlocks(self, blockqueue, stop):
+        clientpool = self.logclient.getClientPool()
+        logclient = clientpool.acquire()
+        item = (None, None)
+        try:
+            for revlogcache in self.__iterLogBlocks(logclient):
+                if(self.__putLogBlock(blockqueue, stop, (revlogcache, None)) == False):
+                    return
+        except Exception:
+            logging.exception("Error in fetching revision logs")
+            item = (None, sys.exc_info())
+        finally:
+            clientpool.release(logclient)
+        self.__putLogBlock(blockqueue, stop, item)
+
+    def __putLogBlock(self, blockqueue, stop, item):
+        '''
+        put the item in the queue. Returns False if the caller has stopped the iteration.
+        '''
+        while(stop.is_set() == False):
+            try:
+                blockqueue.put(item, timeout=0.5)
+                return(True)
+            except queue.Full:
+                pass
+        return(False)
+
+
+class _RevLogJob(object):
+
+    '''
+    one revision log queued for processing by the worker threads of SVNRevLogParallelIter
+    '''
+
+    def __init__(self, revlog):
+        self.revlog = revlog
+        self.error = None
+        self.done = threading.Event()
+
+
+class SVNRevLogParallelIter(object):
+
+    '''
+    Iterate over the revision logs returned by 'revlogiter' and query the path types, binary
+    file status and line counts of each revision in multiple worker threads. Each worker thread
+    uses its own log client (and hence its own pysvn.Client) from the client pool. Revision logs are still returned
+    in the revision order, hence the caller can write them to the database sequentially.
+    If 'revfilter' is given, only the revisions for which revfilter(revno) returns True are
+    queried. Other revisions are returned as it is.
+    '''
+
+    def __init__(self, revlogiter, numworkers, bUpdLineCount=True, maxpending=None, revfilter=None):
+        self.revlogiter = revlogiter
+        self.logclient = revlogiter.logclient
+        self.numworkers = max(numworkers, 1)
+        self.bUpdLineCount = bUpdLineCount
+        self.revfilter = revfilter
+        # maximum number of revisions queued or processed ahead of the caller.
+        if(maxpending == None):
+            maxpending = self.numworkers * 4
+        self.maxpending = max(maxpending, self.numworkers)
+        self.abort = False
+
+    def __iter__(self):
+        return(self.next())
+
+    def next(self):
+        jobqueue = queue.Queue()
+        workers = []
+        for idx in range(0, self.numworkers):
+            worker = threading.Thread(
+                target=self.__worker, args=(jobqueue,), name="svnlogworker%d" % idx)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        pending = collections.deque()
+        # jobs with diff strategy decision, whose results may be needed for the next decisions.
+        decided = collections.deque()
+        try:
+            for revlog in self.revlogiter:
+                job = _RevLogJob(revlog)
+                if(self.__isQueried(revlog) and self.bUpdLineCount == True and revlog.isvalid() == True):
+                    self.__decideDiffStrategy(job, decided)
+                pending.append(job)
+                jobqueue.put(job)
+                while(len(pending) >= self.maxpending):
+                    yield self.__finishJob(pending.popleft())
+
+            while(len(pending) > 0):
+                yield self.__finishJob(pending.popleft())
+        finally:
+            # if the caller stopped early or there is an error, skip the remaining jobs.
+            self.abort = len(pending) > 0
+            for worker in workers:
+                jobqueue.put(None)
+
+    def __isQueried(self, revlog):
+        return(self.revfilter is None or self.revfilter(revlog.revno))
+
+    def __decideDiffStrategy(self, job, decided):
+        '''
+        take the diff strategy decision of the revision in this thread (i.e. in the revision order).
+        The decision uses the results of the revisions decided 'lag' revisions earlier, hence wait
+        till these revisions are finished by the workers.
+        '''
+        diffstats = self.logclient.diffstats
+        if(diffstats is not None):
+            while(len(decided) > 0 and decided[0].revlog.strategypos < diffstats.numdecided - diffstats.lag):
+                with self.logclient.timers.measure('workerwait'):
+                    decided.popleft().done.wait()
+            job.revlog.decideDiffStrategy()
+            decided.append(job)
+
+    def __finishJob(self, job):
+        # time waiting for the repository queries of the worker threads
+        with self.logclient.timers.measure('workerwait'):
+            job.done.wait()
+        if(job.error is not None):
+            six.reraise(*job.error)
+        # all the information is already queried. Switch back to the main log client so that
+        # worker's client is never used from the caller thread.
+        job.revlog.logclient = self.logclient
+        return(job.revlog)
+
+    def __worker(self, jobqueue):
+        clientpool = self.logclient.getClientPool()
+        logclient = clientpool.acquire()
+        try:
+            while True:
+                job = jobqueue.get()
+                if(job is None):
+                    break
+                if(self.abort == False and self.__isQueried(job.revlog)):
+                    try:
+                        job.revlog.logclient = logclient
+                        job.revlog.prefetch(self.bUpdLineCount)
+                    except Exception:
+                        logging.exception(
+                            "Error in processing revision %d" % job.revlog.revno)
+                        job.error = sys.exc_info()
+                job.done.set()
+        finally:
+            clientpool.release(logclient)
+
 
 class SVNChangeEntry(object):
 
     '''
     one change log entry inside one revision log. One revision can contain multiple changes.
+    The values required from the changed path are copied once into the slots, since large
+    revisions can have hundreds of thousands of change entries.
     '''
+    __slots__ = ('parent', 'revno', 'path', 'action', 'copyfrompath', 'copyfromrev',
+                 '_pathtype', '_binary', '_lcadded', '_lcdeleted')
 
     def __init__(self, parent, changedpath):
         '''
-        changedpath is one changed_path dictionary entry in values returned PySVN::Log calls
+        changedpath is one changed_path dictionary entry in values returned PySVN::Log calls.
+        The paths are already normalized by the parent SVNRevLog.
         '''
         self.parent = parent
-        self.logclient = parent.logclient
         self.revno = parent.getRevNo()
-        self.changedpath = changedpath
+        self.path = changedpath['path']
+        self.action = changedpath['action']
+        self.copyfrompath = changedpath['copyfrom_path']
+        rev = changedpath['copyfrom_revision']
+        if(rev != None):
+            assert(rev.kind == pysvn.opt_revision_kind.number)
+            rev = rev.number
+        self.copyfromrev = rev
+        self._pathtype = None
+        self._binary = None
+        self._lcadded = None
+        self._lcdeleted = None
 
     def __updatePathType(self):
         '''
         Update the path type of change entry. 
         '''
-        if('pathtype' not in self.changedpath):
+        if(self._pathtype is None):
             filepath = self.filepath()
-            action = self.change_type()
+            action = self.action
             revno = self.revno
             if(action == 'D'):
                 # if change type is 'D' then reduce the 'revno' to
@@ -100,35 +332,39 @@ class SVNChangeEntry(object):
                 assert(filepath != None)
                 revno = self.prev_revno()
 
+            elif(action == 'A' and self.is_copied()):
+                # copied path has the same type as the copy source. The copy source type is
+                # likely to be in the path type cache already.
+                filepath = self.prev_filepath()
+                revno = self.prev_revno()
+
             # see if directory check is alredy done on this path. If not, then
             # check with the repository
             pathtype = 'F'
-            if(self.logclient.isDirectory(revno, filepath) == True):
+            if(self.parent.logclient.isDirectory(revno, filepath) == True):
                 pathtype = 'D'
-            self.changedpath['pathtype'] = pathtype
-            # filepath may changed in case of 'delete' action.
-            filepath = self.filepath()
-            if(pathtype == 'D' and not filepath.endswith('/')):
+            if(action == 'A' and self.is_copied()):
+                self.parent.logclient.cachePathType(self.filepath(), self.revno, pathtype)
+            self._pathtype = pathtype
+            if(pathtype == 'D' and not self.path.endswith('/')):
                 # if it is directory then add trailing '/' to the path to
                 # denote the directory.
-                self.changedpath['path'] = filepath + '/'
+                self.path = self.path + '/'
 
     def isValidChange(self):
         '''
         check the changed path is valid for the 'given' repository path. All paths are valid
         if the repository path is same is repository 'root'
         '''
-        return(self.logclient.isChildPath(self.filepath()))
+        return(self.parent.logclient.isChildPath(self.filepath()))
 
     def is_branchtag(self):
         '''
         Is this entry represent a branch or tag.
         '''
         branchtag = False
-        if(self.changedpath['action'] == 'A'):
-            path = self.changedpath['copyfrom_path']
-            rev = self.changedpath['copyfrom_revision']
-            if(path != None or rev != None):
+        if(self.action == 'A'):
+            if(self.copyfrompath != None or self.copyfromrev != None):
                 branchtag = True
         return(branchtag)
 
@@ -136,48 +372,45 @@ class SVNChangeEntry(object):
         return(self.pathtype() == 'D')
 
     def change_type(self):
-        return(self.changedpath['action'])
+        return(self.action)
 
     def filepath(self):
-        fpath = normurlpath(self.changedpath['path'])
-        return(fpath)
+        return(self.path)
 
     def prev_filepath(self):
-        prev_filepath = self.changedpath.get('copyfrom_path')
+        prev_filepath = self.copyfrompath
         if(prev_filepath == None or len(prev_filepath) == 0):
-            prev_filepath = self.filepath()
+            prev_filepath = self.path
         return (prev_filepath)
 
     def prev_revno(self):
-        prev_revno = self.changedpath.get('copyfrom_revision')
+        prev_revno = self.copyfromrev
         if(prev_revno == None):
             prev_revno = self.revno - 1
-        else:
-            assert(
-                isinstance(prev_revno, type(pysvn.Revision(pysvn.opt_revision_kind.number, 0))))
-            prev_revno = prev_revno.number
-
         return(prev_revno)
 
     def filepath_unicode(self):
-        return(makeunicode(self.filepath()))
+        return(makeunicode(self.path))
 
     def lc_added(self):
-        lc = self.changedpath.get('lc_added', 0)
+        lc = self._lcadded
+        if(lc == None):
+            lc = 0
         return(lc)
 
     def lc_deleted(self):
-        lc = self.changedpath.get('lc_deleted', 0)
+        lc = self._lcdeleted
+        if(lc == None):
+            lc = 0
         return(lc)
 
     def is_copied(self):
         '''
         return True if this change is copied from somewhere
         '''
-        path = self.changedpath['copyfrom_path']
-        rev = self.changedpath['copyfrom_revision']
+        path = self.copyfrompath
         is_copied = False
-        if(path != None and len(path) > 0 and rev != None):
+        if(path != None and len(path) > 0 and self.copyfromrev != None):
             is_copied = True
         return is_copied
 
@@ -185,53 +418,48 @@ class SVNChangeEntry(object):
         '''
         get corrected copy from path.
         '''
-        path = self.changedpath['copyfrom_path']
+        path = self.copyfrompath
         if self.isDirectory() and path is not None and not path.endswith('/'):
             path = path + '/'
         return(makeunicode(path))
 
     def copyfrom(self):
-        path = self.copyfrom_path()
-        rev = self.changedpath['copyfrom_revision']
-        revno = None
-        if(rev != None):
-            assert(rev.kind == pysvn.opt_revision_kind.number)
-            revno = rev.number
-
-        return(path, revno)
+        return(self.copyfrom_path(), self.copyfromrev)
 
     def pathtype(self):
         '''
         path type is (F)ile or (D)irectory
         '''
         self.__updatePathType()
-        pathtype = self.changedpath['pathtype']
+        pathtype = self._pathtype
         assert(pathtype == 'F' or (
-            pathtype == 'D' and self.filepath().endswith('/')))
+            pathtype == 'D' and self.path.endswith('/')))
         return(pathtype)
 
     def isBinaryFile(self):
         '''
         if the change is in a binary file.        
         '''
-        binary = False
-        # check detailed binary check only if the change entry is of a file.
-        if(self.pathtype() == 'F'):
-            revno = self.revno
-            filepath = self.filepath()
+        if(self._binary is None):
+            binary = False
+            # check detailed binary check only if the change entry is of a file.
+            if(self.pathtype() == 'F'):
+                revno = self.revno
+                filepath = self.filepath()
 
-            if(self.change_type() == 'D'):
-                # if change type is 'D' then reduce the 'revno' to
-                # appropriately detect the binary file type.
-                logging.debug("Found file deletion for <%s>" % filepath)
-                filepath = self.prev_filepath()
-                revno = self.prev_revno()
-            binary = self.logclient.isBinaryFile(filepath, revno)
+                if(self.action == 'D'):
+                    # if change type is 'D' then reduce the 'revno' to
+                    # appropriately detect the binary file type.
+                    logging.debug("Found file deletion for <%s>" % filepath)
+                    filepath = self.prev_filepath()
+                    revno = self.prev_revno()
+                binary = self.parent.logclient.isBinaryFile(filepath, revno)
+            self._binary = binary
 
-        return(binary)
+        return(self._binary)
 
     def updateDiffLineCountFromDict(self, diffCountDict):
-        if('lc_added' not in self.changedpath):
+        if(self._lcadded is None):
             try:
                 linesadded = 0
                 linesdeleted = 0
@@ -239,17 +467,17 @@ class SVNChangeEntry(object):
 
                 if(diffCountDict != None and filename in diffCountDict and not self.isBinaryFile()):
                     linesadded, linesdeleted = diffCountDict[filename]
-                    self.changedpath['lc_added'] = linesadded
-                    self.changedpath['lc_deleted'] = linesdeleted
+                    self._lcadded = linesadded
+                    self._lcdeleted = linesdeleted
             except:
                 logging.exception("Diff Line error")
                 raise
 
     def getDiffLineCount(self):
-        added = self.changedpath.get('lc_added', 0)
-        deleted = self.changedpath.get('lc_deleted', 0)
+        added = self.lc_added()
+        deleted = self.lc_deleted()
 
-        if('lc_added' not in self.changedpath):
+        if(self._lcadded is None):
             revno = self.revno
             filepath = self.filepath()
             changetype = self.change_type()
@@ -261,9 +489,9 @@ class SVNChangeEntry(object):
                 # path is added or deleted. First check if the path is a directory. If path is not a directory
                 # then process further.
                 if(changetype == 'A'):
-                    added = self.logclient.getLineCount(filepath, revno)
+                    added = self.parent.logclient.getLineCount(filepath, revno)
                 elif(changetype == 'D'):
-                    deleted = self.logclient.getLineCount(
+                    deleted = self.parent.logclient.getLineCount(
                         prev_filepath, prev_revno)
                 elif (changetype == 'R'):
                     # change type 'R' (replace) means files contents are replaced hence
@@ -276,7 +504,7 @@ class SVNChangeEntry(object):
                         added, deleted = self.__getDiffLineCount(
                             filepath, revno, None, None)
                     except:
-                        added = self.logclient.getLineCount(filepath, revno)
+                        added = self.parent.logclient.getLineCount(filepath, revno)
                 else:
                     # change type is 'changetype != 'A' and changetype != 'D'
                     #directory is modified
@@ -285,13 +513,13 @@ class SVNChangeEntry(object):
 
             logging.debug("DiffLineCount %d : %s : %s : %d : %d " %
                           (revno, filename, changetype, added, deleted))
-            self.changedpath['lc_added'] = added
-            self.changedpath['lc_deleted'] = deleted
+            self._lcadded = added
+            self._lcdeleted = deleted
 
         return(added, deleted)
 
     def __getDiffLineCount(self, filepath, revno, prev_filepath, prev_revno):
-        diff_log = self.logclient.getRevFileDiff(
+        diff_log = self.parent.logclient.getRevFileDiff(
             filepath, revno, prev_filepath, prev_revno)
         diffDict = getDiffLineCountDict(diff_log)
         added = 0
@@ -309,12 +537,25 @@ class SVNRevLog(object):
     def __init__(self, logclient, revnolog, bUseFileDiff):
         self.logclient = logclient
         self.bUseFileDiff = bUseFileDiff
-        if(isinstance(revnolog, pysvn.PysvnLog) == False):
+        self.diffcountdict = None
+        # (strategy, mapped, fallback) of the diff used for line counts. strategy is (R)evision
+        # level, (F)ile level or (M)ixed (see DiffStrategyStats.add). None till line counts are updated.
+        self.diffstrategy = None
+        # diff strategy decision of the revision i.e. if revision level diff is to be tried
+        # and position of the decision in the DiffStrategyStats (see decideDiffStrategy)
+        self.userevdiff = None
+        self.strategypos = None
+        # change entries and their classification are computed once per revision.
+        self.changeentries = None
+        self.filechanges = None
+        self.copieddirs = None
+        self.deleteddirs = None
+        self.filecounts = None
+        if(isinstance(revnolog, six.integer_types)):
             self.revlog = self.logclient.getLog(revnolog, detailedLog=True)
         else:
+            # pysvn.PysvnLog or an object with the same attributes (e.g. log read from a dump)
             self.revlog = revnolog
-        assert(self.revlog == None or isinstance(
-            revnolog, pysvn.PysvnLog) == True)
         if(self.revlog):
             self.__normalizePaths()
             self.__updateCopyFromPaths()
@@ -347,73 +588,90 @@ class SVNRevLog(object):
         Check Issue 44.
         '''
         assert(self.revlog is not None)
-        # First check if there are any additions with 'copy_from'
-
-        copyfrom = [(change['path'], change['copyfrom_path'], change['copyfrom_revision'])
-                    for change in self.revlog.changed_paths
-                    if(change['copyfrom_path'] != None and len(change['copyfrom_path']) > 0)]
+        # index the copied paths by their directory prefix. Then the copy source of each modified
+        # or deleted path can be found by looking up its parent directories (i.e. proportional to
+        # path depth) instead of comparing every changed path with every copied path.
+        copyfrom = dict()
+        copies = [(change['path'], change['copyfrom_path'], change['copyfrom_revision'])
+                  for change in self.revlog.changed_paths
+                  if(change['copyfrom_path'] != None and len(change['copyfrom_path']) > 0)]
+        for curpath, copyfrompath, copyfromrev in sorted(copies, key=itemgetter(0), reverse=True):
+            # change the curpath to 'directory name'. otherwise it doesnot make sense to add a copy path entry
+            # for example 'curpath' /trunk/xxx and there is also a deleted entry called '/trunk/xxxyyy'. then in such
+            # case don't replace the 'copyfrom_path'. replace it
+            # only if entry is '/trunk/xxx/yyy'
+            if(not curpath.endswith('/')):
+                curpath = curpath + '/'
+            # make sure that copyfrom path also ends with '/' since we are replacing directories
+            # curpath ends with '/'
+            if(not copyfrompath.endswith('/')):
+                copyfrompath = copyfrompath + '/'
+            copyfrom.setdefault(curpath, (copyfrompath, copyfromrev))
+        copies = None
 
         if(len(copyfrom) > 0):
-            copyfrom = sorted(copyfrom, key=itemgetter(0), reverse=True)
-
             for change in self.revlog.changed_paths:
                 # check other modified or deleted paths (i.e. all actions other
                 # than add)
-                if(change['action'] != 'A'):
+                if(change['action'] != 'A' and change['copyfrom_path'] is None):
                     curfilepath = change['path']
-                    for curpath, copyfrompath, copyfromrev in copyfrom:
-                        # change the curpath to 'directory name'. otherwise it doesnot make sense to add a copy path entry
-                        # for example 'curpath' /trunk/xxx and there is also a deleted entry called '/trunk/xxxyyy'. then in such
-                        # case don't replace the 'copyfrom_path'. replace it
-                        # only if entry is '/trunk/xxx/yyy'
-                        if(not curpath.endswith('/')):
-                            curpath = curpath + '/'
-                        if(curfilepath.startswith(curpath) and change['copyfrom_path'] is None):
-                            # make sure that copyfrom path also ends with '/' since we are replacing directories
-                            # curpath ends with '/'
-                            if(not copyfrompath.endswith('/')):
-                                copyfrompath = copyfrompath + '/'
+                    # the innermost copied directory decides the copy source.
+                    idx = len(curfilepath)
+                    while(idx > 0):
+                        idx = curfilepath.rfind('/', 0, idx)
+                        if(idx < 0):
+                            break
+                        curpath = curfilepath[:idx + 1]
+                        if(curpath in copyfrom):
+                            copyfrompath, copyfromrev = copyfrom[curpath]
                             assert(change['copyfrom_revision'] is None)
                             change['copyfrom_path'] = normurlpath(
-                                curfilepath.replace(curpath, copyfrompath, 1))
+                                copyfrompath + curfilepath[idx + 1:])
                             change['copyfrom_revision'] = copyfromrev
+                            break
 
     def getChangeEntries(self):
         '''
-        get the change entries from each changed path entry
+        get the change entries from each changed path entry. The change entries are created
+        only once per revision.
         '''
-        for change in self.revlog.changed_paths:
-            change_entry = SVNChangeEntry(self, change)
-            if(change_entry.isValidChange()):
-                yield change_entry
+        if(self.changeentries is None):
+            changeentries = []
+            for change in self.revlog.changed_paths:
+                change_entry = SVNChangeEntry(self, change)
+                if(change_entry.isValidChange()):
+                    changeentries.append(change_entry)
+            self.changeentries = changeentries
+        return(self.changeentries)
 
     def getFileChangeEntries(self):
         '''
         filter the change entries to return only the file change entries.
         '''
-        for change_entry in self.getChangeEntries():
-            if change_entry.isDirectory() == False:
-                yield change_entry
+        self.__classifyChanges()
+        return(self.filechanges)
 
-    def changedFileCount(self):
-        '''includes directory and files. Initially I wanted to only add the changed file paths.
-        however it is not possible to detect if the changed path is file or directory from the
-        svn log output
-        bChkIfDir -- If this flag is false, then treat all changed paths as files.
-           since isDirectory function calls the svn client 'info' command, treating all changed
-           paths as files will avoid calls to isDirectory function and speed up changed file count
-           computations
+    def __classifyChanges(self):
         '''
+        single pass over the change entries to find the changed file counts, the file change
+        entries and the copied/deleted directories of this revision.
+        '''
+        if(self.filecounts is not None):
+            return
         filesadded = 0
         fileschanged = 0
         filesdeleted = 0
+        filechanges = []
+        copieddirs = []
+        deleteddirs = []
         logging.debug("Changed path count : %d" %
                       len(self.revlog.changed_paths))
 
         for change in self.getChangeEntries():
             isdir = change.isDirectory()
+            action = change.change_type()
             if(isdir == False):
-                action = change.change_type()
+                filechanges.append(change)
                 if(action == 'A'):
                     filesadded = filesadded + 1
                 elif(action == 'D'):
@@ -422,8 +680,39 @@ class SVNRevLog(object):
                     # action can be 'M' or 'R'
                     assert(action == 'M' or action == 'R')
                     fileschanged = fileschanged + 1
+            else:
+                if(change.is_copied()):
+                    copieddirs.append(change)
+                if(action == 'D'):
+                    deleteddirs.append(change)
 
-        return(filesadded, fileschanged, filesdeleted)
+        self.filechanges = filechanges
+        self.copieddirs = copieddirs
+        self.deleteddirs = deleteddirs
+        self.filecounts = (filesadded, fileschanged, filesdeleted)
+
+    def changedFileCount(self):
+        '''includes directory and files. Initially I wanted to only add the changed file paths.
+        however it is not possible to detect if the changed path is file or directory from the
+        svn log output
+        bChkIfDir -- If this flag is false, then treat all changed paths as files.
+           since isDirectory function calls the svn client 'info' command, treating all changed
+           paths as files will avoid calls to isDirectory function and speed up changed file count
+           computations
+        '''
+        self.__classifyChanges()
+        return(self.filecounts)
+
+    def prefetch(self, bUpdLineCount=True):
+        '''
+        query all the information required for this revision (path types, binary file status
+        and line counts) from the repository. After this call, the change entries can be processed
+        without any further repository calls. Used by the worker threads of SVNRevLogParallelIter.
+        '''
+        self.changedFileCount()
+        if(self.isvalid() == True):
+            for change in self.getDiffLineCount(bUpdLineCount):
+                pass
 
     def getDiffLineCount(self, bUpdLineCount=True):
         """
@@ -433,7 +722,9 @@ class SVNRevLog(object):
         """
         diffCountDict = None
         if(bUpdLineCount == True):
-            diffCountDict = self.__updateDiffCount()
+            if(self.diffcountdict is None):
+                self.diffcountdict = self.__updateDiffCount()
+            diffCountDict = self.diffcountdict
 
         # get change entries sorted in the order of actions, and then paths.
 
@@ -452,18 +743,15 @@ class SVNRevLog(object):
         return a list of change entries where directory is added/replaced during
         this revision changes.
         '''
-        changelist = [change for change in self.getChangeEntries()
-                      if(change.is_copied() and change.isDirectory())]
-
-        return changelist
+        self.__classifyChanges()
+        return(self.copieddirs)
 
     def getDeletedDirs(self):
         '''
         return a list of change entries of where a directory is deleted
         '''
-        changelist = [change for change in self.getChangeEntries()
-                      if(change.isDirectory() and change.change_type() == 'D')]
-        return changelist
+        self.__classifyChanges()
+        return(self.deleteddirs)
 
     def getRevNo(self):
         return(self.revlog.revision.number)
@@ -502,59 +790,93 @@ class SVNRevLog(object):
             return(filesadded + fileschanged + filesdeleted)
         return(None)
 
-    def __useFileRevDiff(self):
+    def __useRevisionDiff(self):
         '''
-        file level revision diff requires less memory but more calls to repository.
-        Hence for large sized repositories, repository with many large commits, and
-        repositories which are local file system, it is better to use file level revision
-        diff. For other cases it is better to query diff of entire revision at a time.
+        revision level diff needs one call to the repository for the entire revision. However
+        copied or deleted directories will include all the files in the directory in the diff
+        (i.e. large memory and no use as line counts of directory contents are not required).
+        Hence use file level diffs for such revisions and revisions with very large number of
+        file additions/deletions. For other revisions, the diff strategy statistics decide if the
+        revision level diff is likely to match the changed paths.
         '''
         if self.bUseFileDiff == True:
-            return True
-
-        # repourl is not same as repository root (e.g. <root>/trunk) then we have to
-        # use the file revision diffs.
-        usefilerevdiff = True
-        if(self.logclient.isRepoUrlSameAsRoot()):
-            usefilerevdiff = False
-        rooturl = self.logclient.getRootUrl()
-        if(rooturl.startswith('file://')):
-            usefilerevdiff = True
-        if(not usefilerevdiff):
-            # check if there are additions or deletions. If yes, then use 'file level diff' to
-            # avoid memory errors in large number of file additions or
-            # deletions.
-            fadded, fchanged, fdeleted = self.changedFileCount()
-            if(fadded > 1 or fdeleted > 1 or fchanged > 5):
-                usefilerevdiff = True
-
-        # For the time being always return True, as in case of 'revision level' diff filenames returned
-        # in the diff are different than the filename returned by the svn log. hence this will result
-        # wrong linecount computation. So far, I don't have good fix for this condition. Hence falling
-        # back to using 'file level' diffs. This will result in multiple calls to repository and hence
-        # will be slower but linecount data will be  more reliable. -- Nitin (15 Dec 2010)
-        # usefilerevdiff=True
-        return(usefilerevdiff)
+            return False
+
+        fadded, fchanged, fdeleted = self.changedFileCount()
+        if(fadded + fchanged + fdeleted == 0 or fadded + fdeleted > REVDIFF_MAXFILES):
+            return False
+        if(len(self.getCopiedDirs()) > 0 or len(self.getDeletedDirs()) > 0):
+            return False
+
+        return(self.userevdiff)
+
+    def decideDiffStrategy(self):
+        '''
+        decide if the revision level diff is to be tried for this revision with the diff strategy
+        statistics. The decision must be taken in the revision order, hence SVNRevLogParallelIter
+        calls it before the revision is given to a worker thread.
+        '''
+        if(self.userevdiff is None):
+            self.userevdiff = True
+            if(self.logclient.diffstats is not None):
+                self.strategypos, self.userevdiff = self.logclient.diffstats.useRevisionDiff()
+
+    def __prefetchMimeTypes(self):
+        '''
+        query the mime-types of all the changed files of this revision in batches, so that
+        binary file checks of the change entries don't need one repository call per file.
+        '''
+        pathrevlist = []
+        for change in self.getFileChangeEntries():
+            if(change.change_type() == 'D'):
+                pathrevlist.append((change.prev_filepath(), change.prev_revno()))
+            else:
+                pathrevlist.append((change.filepath(), change.revno))
+        self.logclient.prefetchMimeTypes(pathrevlist)
 
     def __updateDiffCount(self):
         diffcountdict = dict()
         try:
             revno = self.getRevNo()
             logging.debug("Updating line count for revision %d" % revno)
-            if(self.__useFileRevDiff()):
+            self.decideDiffStrategy()
+            self.__prefetchMimeTypes()
+            strategy = 'F'
+            mapped = 0
+            fallback = 0
+            if(self.__useRevisionDiff()):
+                # get 'diff' of multiple files included in a 'revision' by a single svn api call.
+                # paths in the diff are mapped to changed paths of the log and file level diffs
+                # are used for the changed files which are not found in the diff.
+                logging.debug("Using entire revision diff at a time")
+                try:
+                    revdiff_log = self.logclient.getRevDiff(revno)
+                    diffcountdict = self.logclient.mapDiffPaths(getDiffLineCountDict(revdiff_log),
+                        [change.filepath() for change in self.getFileChangeEntries()])
+                    revdiff_log = None
+                except pysvn.ClientError:
+                    logging.debug("Revision level diff failed for revision %d" % revno)
+                    diffcountdict = dict()
+                mapped = len(diffcountdict)
+                for change in self.getFileChangeEntries():
+                    filename = change.filepath()
+                    if(filename not in diffcountdict):
+                        diffcountdict[filename] = change.getDiffLineCount()
+                        if(not change.isBinaryFile()):
+                            fallback = fallback + 1
+                if(fallback == 0):
+                    strategy = 'R'
+                elif(mapped > 0):
+                    strategy = 'M'
+            else:
                 logging.debug("Using file level revision diff")
                 for change in self.getChangeEntries():
                     filename = change.filepath()
                     diffcountdict[filename] = change.getDiffLineCount()
-            else:
-                # if the svnrepourl and root url are same then we can use 'revision level' diff calls
-                # get 'diff' of multiple files included in a 'revision' by a single svn api call.
-                # As All the changes are 'modifications' (M type) then directly call the 'getRevDiff'.
-                # getRevDiff fails if there are files added or 'deleted' and repository path is not
-                # the root path.
-                logging.debug("Using entire revision diff at a time")
-                revdiff_log = self.logclient.getRevDiff(revno)
-                diffcountdict = getDiffLineCountDict(revdiff_log)
+
+            self.diffstrategy = (strategy, mapped, fallback)
+            if(self.logclient.diffstats is not None):
+                self.logclient.diffstats.add(self.strategypos, revno, strategy, mapped, fallback)
 
         except Exception as expinst:
             logging.exception("Error in diffline count")
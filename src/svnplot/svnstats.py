@@ -24,6 +24,24 @@ from collections import Counter
 
 from .util import *
 
+# sql fragments of the author based queries. Databases created by older versions of svnlog2sqlite
+# do not have SVNAuthors table and SVNLog.authorid column till svnlog2sqlite updates them. For
+# such databases the queries use the author names.
+AUTHOR_ID_SQL = {
+    'name': 'SVNAuthors.name',
+    'tables': ', SVNAuthors',
+    'join': 'and SVNLog.authorid = SVNAuthors.id',
+    'group': 'SVNLog.authorid',
+    'filter': 'SVNLog.authorid=(select id from SVNAuthors where name=?)',
+    'column': 'authorid'}
+AUTHOR_NAME_SQL = {
+    'name': 'SVNLog.author',
+    'tables': '',
+    'join': '',
+    'group': 'SVNLog.author COLLATE NOCASE',
+    'filter': 'SVNLog.author=?',
+    'column': 'author'}
+
 COOLINGRATE = 0.06 / 24.0  # degree per hour
 TEMPINCREMENT = 10.0  # degrees per commit
 AMBIENT_TEMP = 1.1
@@ -184,6 +202,16 @@ class SVNStats(object):
         self.cur = self.dbcon.cursor()
         # set the LIKE operator to case sensitive behavior
         self.cur.execute("pragma case_sensitive_like(TRUE)")
+        self.authsql = AUTHOR_NAME_SQL
+        if(self.__hasTable('SVNAuthors')):
+            self.authsql = AUTHOR_ID_SQL
+            # index is not there if svnlog2sqlite bulk load was interrupted. It is possible that
+            # database is read only. In such cases ignore the exception
+            try:
+                self.cur.execute(
+                    "CREATE INDEX IF NOT EXISTS svnlogauthoridx ON SVNLog (authorid ASC)")
+            except sqlite3.Error:
+                pass
 
         self.__init_start_end_revisions(firstrev, lastrev)
 
@@ -199,16 +227,6 @@ class SVNStats(object):
         self.dbcon.create_function("sqrt", 1, _sqrt)
         self.dbcon.create_aggregate("deltastddev", 1, DeltaStdDev)
 
-        # it is possible, index is already there. in such cases ignore the
-        # exception
-        try:
-            # create an index based on author names as we need various author based
-            # statistics
-            self.cur.execute(
-                "CREATE TEMP INDEX SVNLogAuthIdx ON SVNLog (author ASC)")
-        except:
-            pass
-
     def __init_start_end_revisions(self, firstrev, lastrev):
         '''
         initialize the start and end revision numbers and start/end dates for queries 
@@ -266,6 +284,26 @@ class SVNStats(object):
             #row = self.cur.fetchone()
             self.__startRev = firstrev
 
+    def __hasTable(self, tablename):
+        '''
+        check if the table exists in the database (i.e. database is created by the newer version
+        of svnlog2sqlite)
+        '''
+        self.cur.execute(
+            "select count(*) from sqlite_master where type='table' and name=?", (tablename,))
+        return(self.cur.fetchone()[0] > 0)
+
+    def __getAuthorKey(self, author):
+        '''
+        get the value of SVNLog author column ('authorid' or 'author') for the author as sql
+        literal. Returns None if the author is not found.
+        '''
+        if(self.authsql is AUTHOR_NAME_SQL):
+            return("'%s'" % author)
+        self.cur.execute("select id from SVNAuthors where name=?", (author,))
+        row = self.cur.fetchone()
+        return(str(row[0]) if row != None else None)
+
     def closedb(self):
         if(self.dbcon != None):
             self.cur.close()
@@ -378,8 +416,9 @@ class SVNStats(object):
     def getAuthorList(self, numAuthors=None):
         # Find out the unique developers and their number of commit sorted in
         # 'descending' order
-        self.cur.execute("select SVNLog.author, count(*) as commitcount from SVNLog, search_view \
-                        where search_view.revno = SVNLog.revno group by SVNLog.author COLLATE NOCASE order by commitcount desc")
+        self.cur.execute("select %(name)s, count(*) as commitcount from SVNLog, search_view%(tables)s \
+                        where search_view.revno = SVNLog.revno %(join)s \
+                        group by %(group)s order by commitcount desc" % self.authsql)
 
         # get the auhor list (ignore commitcount) and store it. Since LogGraphLineByDev also does an sql query. It will otherwise
         # get overwritten
@@ -603,10 +642,11 @@ class SVNStats(object):
         numAuthors - number authors to return depending on the contribution of authors. 
         returns four lists (authors, percentage of added files, percentage of changed files and percentage of deleted files)
         '''
-        self.cur.execute("select SVNLog.author, sum(SVNLog.addedfiles), sum(SVNLog.changedfiles), \
-                         sum(SVNLog.deletedfiles), count(distinct SVNLog.revno) as commitcount from SVNLog, SVNLogDetailVw \
+        self.cur.execute("select %(name)s, sum(SVNLog.addedfiles), sum(SVNLog.changedfiles), \
+                         sum(SVNLog.deletedfiles), count(distinct SVNLog.revno) as commitcount from SVNLog, SVNLogDetailVw%(tables)s \
                          where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? \
-                         group by SVNLog.author COLLATE NOCASE order by commitcount DESC LIMIT 0, ?", (self.sqlsearchpath, numAuthors,))
+                         %(join)s \
+                         group by %(group)s order by commitcount DESC LIMIT 0, ?" % self.authsql, (self.sqlsearchpath, numAuthors,))
 
         authlist = []
         addfraclist = []
@@ -684,10 +724,16 @@ class SVNStats(object):
         files in subdirectories)        
         maxdircount - limits the number of directories on the graph to the x largest directories 
         '''
-        self.cur.execute("select dirname(?, SVNLogDetailVw.changedpath, ?) as dirpath, sum(SVNLogDetailVw.linesadded), \
-                         sum(SVNLogDetailVw.linesdeleted) from SVNLog, SVNLogDetailVw \
-                    where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? \
-                    group by dirpath", (self.searchpath, dirdepth, self.sqlsearchpath,))
+        if(self.__hasTable('PathLoC')):
+            # current line count of each path is already calculated by svnlog2sqlite.
+            self.cur.execute("select dirname(?, SVNPaths.path, ?) as dirpath, sum(PathLoC.loc), 0 \
+                        from PathLoC, SVNPaths where PathLoC.pathid = SVNPaths.id and SVNPaths.path like ? \
+                        group by dirpath", (self.searchpath, dirdepth, self.sqlsearchpath,))
+        else:
+            self.cur.execute("select dirname(?, SVNLogDetailVw.changedpath, ?) as dirpath, sum(SVNLogDetailVw.linesadded), \
+                             sum(SVNLogDetailVw.linesdeleted) from SVNLog, SVNLogDetailVw \
+                        where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? \
+                        group by dirpath", (self.searchpath, dirdepth, self.sqlsearchpath,))
 
         dirinfolist = []
         totalloc = 0
@@ -828,8 +874,9 @@ class SVNStats(object):
         get the commit activit by hour of day stats for author 'author'
         returns two lists (dates , time at which commits happened on that date) for author.
         '''
-        self.cur.execute('select strftime("%H", SVNLog.commitdate,"localtime"), date(SVNLog.commitdate,"localtime") as "commitdate [date]" \
-                    from SVNLog, search_view where search_view.revno=SVNLog.revno and SVNLog.author=? group by commitdate order by commitdate ASC', (author,))
+        self.cur.execute('select strftime("%%H", SVNLog.commitdate,"localtime"), date(SVNLog.commitdate,"localtime") as "commitdate [date]" \
+                    from SVNLog, search_view where search_view.revno=SVNLog.revno \
+                    and %(filter)s group by commitdate order by commitdate ASC' % self.authsql, (author,))
 
         dates = []
         committimelist = []
@@ -845,8 +892,9 @@ class SVNStats(object):
         '''
         self.cur.execute('select date(SVNLog.commitdate,"localtime") as "commitdate [date]", sum(SVNLogDetailVw.linesadded),\
                         sum(SVNLogDetailVw.linesdeleted) from SVNLog, SVNLogDetailVw \
-                         where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? and SVNLog.author=? \
-                         group by "commitdate [date]" order by commitdate ASC', (self.sqlsearchpath, author,))
+                         where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? \
+                         and %(filter)s \
+                         group by "commitdate [date]" order by commitdate ASC' % self.authsql, (self.sqlsearchpath, author,))
         dates = []
         loc = []
         totalloc = 0
@@ -999,9 +1047,11 @@ class SVNStats(object):
         '''
         authset = set(self.getAuthorList(numTopAuthors))
 
-        self.cur.execute('select SVNLog.revno, SVNLog.author, SVNLog.commitdate as "commitdate [timestamp]" from SVNLog,SVNLogDetailVw \
+        self.cur.execute('select SVNLog.revno, %(name)s, SVNLog.commitdate as "commitdate [timestamp]" \
+                         from SVNLog, SVNLogDetailVw%(tables)s \
                          where SVNLog.revno = SVNLogDetailVw.revno and SVNLogDetailVw.changedpath like ? \
-                         group by SVNLogDetailVw.revno order by SVNLogDetailVw.revno ASC', (self.sqlsearchpath,))
+                         %(join)s \
+                         group by SVNLogDetailVw.revno order by SVNLogDetailVw.revno ASC' % self.authsql, (self.sqlsearchpath,))
 
         lastcommitdate = None
         revnolist = []
@@ -1168,8 +1218,8 @@ class SVNStats(object):
 
     def _getAuthActivityDict(self):
         self._updateActivityHotness()
-        self.cur.execute('select SVNLog.author, SVNLog.commitdate as "commitdate [timestamp]" from SVNLog, search_view \
-                    where SVNLog.revno = search_view.revno order by commitdate ASC')
+        self.cur.execute('select %(name)s, SVNLog.commitdate as "commitdate [timestamp]" from SVNLog, search_view%(tables)s \
+                    where SVNLog.revno = search_view.revno %(join)s order by commitdate ASC' % self.authsql)
 
         authActivityIdx = dict()
         for author, cmdate in self.cur:
@@ -1225,7 +1275,8 @@ class SVNStats(object):
         '''
         authActivityIdx = self._getAuthActivityDict()
         self.cur.execute(
-            "select SVNLog.author, count(SVNLog.revno) as commitcount from SVNLog,search_view where search_view.revno=SVNLog.revno group by SVNLog.author")
+            "select %(name)s, count(SVNLog.revno) as commitcount from SVNLog, search_view%(tables)s \
+            where search_view.revno=SVNLog.revno %(join)s group by SVNLog.%(column)s" % self.authsql)
         authCloud = []
         for author, commitcount in self.cur:
             activity = authActivityIdx[author]
@@ -1298,12 +1349,12 @@ class SVNStats(object):
         author_filter_view = '''CREATE TEMP VIEW IF NOT EXISTS '%(author)s_view' AS
                 select (select COUNT(0)
                 from SVNLog log_a
-                where log_a.revno >= log_b.revno and log_a.author = '%(author)s'
-                ) as rownum,  log_b.* from SVNLog log_b where log_b.author='%(author)s'
+                where log_a.revno >= log_b.revno and log_a.%(column)s = %(authorkey)s
+                ) as rownum,  log_b.* from SVNLog log_b where log_b.%(column)s=%(authorkey)s
                 ORDER by log_b.commitdate ASC'''
 
-        stddev_query = "select deltastddev(julianday(SVNLog.commitdate)) from SVNLog where SVNLog.author= ? \
-                    order by SVNLog.commitdate"
+        stddev_query = "select deltastddev(julianday(SVNLog.commitdate)) from SVNLog where %(filter)s \
+                    order by SVNLog.commitdate" % self.authsql
 
         author_filter_query = '''SELECT * FROM '%(author)s_view' ORDER by commitdate ASC'''
 
@@ -1312,9 +1363,9 @@ class SVNStats(object):
                 WHERE date('%(endDate)s', '-%(months)s month') < commitdate
                 ORDER by commitdate ASC'''
 
-            stddev_query = "select deltastddev(julianday(SVNLog.commitdate)) from SVNLog where SVNLog.author= ? \
+            stddev_query = "select deltastddev(julianday(SVNLog.commitdate)) from SVNLog where %s \
                     and date('%s', '-%d month') < SVNLog.commitdate \
-                    order by SVNLog.commitdate" % (self.__endDate, months)
+                    order by SVNLog.commitdate" % (self.authsql['filter'], self.__endDate, months)
 
         avg_query_sql = '''SELECT AVG(IFNULL(julianday(SVNLog_B.commitdate) - julianday(SVNLog_A.commitdate), 0)) 
                     FROM (%(auth_query)s) as SVNLog_A 
@@ -1322,8 +1373,12 @@ class SVNStats(object):
                     order by SVNLog_A.rownum'''
 
         for auth in authList:
+            authorkey = self.__getAuthorKey(auth)
+            if(authorkey == None):
+                continue
             auth_query = author_filter_view % {
-                'author': auth, 'endDate': self.__endDate, 'months': months}
+                'author': auth, 'column': self.authsql['column'], 'authorkey': authorkey,
+                'endDate': self.__endDate, 'months': months}
             self.cur.execute(auth_query)
 
             auth_query = author_filter_query % {
@@ -1369,7 +1424,8 @@ class SVNStats(object):
 
         for auth in authList:
             self.cur.execute(
-                'select SVNLog.commitdate from SVNLog where SVNLog.author= ? order by SVNLog.commitdate', (auth,))
+                'select SVNLog.commitdate from SVNLog where %(filter)s \
+                order by SVNLog.commitdate' % self.authsql, (auth,))
             prevval = None
             for cmdate, in self.cur:
                 if(prevval != None):
@@ -14,10 +14,41 @@ import os.path
 import re
 import time
 import datetime
+import threading
+import collections
+from contextlib import contextmanager
 
 import six
 
+try:
+    from functools import lru_cache
+except ImportError:
+    # python 2 doesnot have functools.lru_cache. Simple thread safe replacement for it
+    # (only positional arguments are supported).
+    def lru_cache(maxsize=128):
+        def decorator(func):
+            cache = collections.OrderedDict()
+            lock = threading.Lock()
+
+            def wrapper(*args):
+                with lock:
+                    if(args in cache):
+                        result = cache.pop(args)
+                        cache[args] = result
+                        return(result)
+                result = func(*args)
+                with lock:
+                    cache[args] = result
+                    if(len(cache) > maxsize):
+                        cache.popitem(last=False)
+                return(result)
+            wrapper.cache_clear = cache.clear
+            return(wrapper)
+        return(decorator)
+
 URL_NORM_RE = re.compile('[/]+')
+# number of normalized paths remembered by normurlpath.
+NORMPATH_CACHE_SIZE = 50000
 
 
 def filetype(path):
@@ -49,6 +80,14 @@ def normurlpath(pathstr):
     '''
     normalize url path. I cannot use 'normpath' directory as it changes path seperator to 'os' default path seperator.
     '''
+    if(isinstance(pathstr, six.text_type) and '//' not in pathstr):
+        # most of the paths are already normalized unicode strings. Nothing to change.
+        return(pathstr)
+    return(_normurlpath(pathstr))
+
+
+@lru_cache(maxsize=NORMPATH_CACHE_SIZE)
+def _normurlpath(pathstr):
     nrmpath = pathstr
     if(nrmpath):
         nrmpath = re.sub(URL_NORM_RE, '/', nrmpath)
@@ -119,3 +158,42 @@ def makeunicode(s):
                 uns = six.text_type(s, 'latin_1', errors)
         assert(isinstance(uns, six.text_type))
     return(uns)
+
+
+class StageTimers(object):
+    '''
+    time spent and number of calls in each stage of the conversion (e.g. log fetch, diff, database
+    insert). Stages are timed in multiple threads (e.g. worker threads), hence the total time of
+    the stages can be more than the elapsed time.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.starttime = time.time()
+
+    @contextmanager
+    def measure(self, stage):
+        starttime = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - starttime)
+
+    def add(self, stage, seconds, calls=1):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += calls
+
+    def elapsed(self):
+        return(time.time() - self.starttime)
+
+    def summary(self):
+        '''
+        return dictionary of stage -> {'seconds':total time, 'calls':number of calls}
+        '''
+        with self.lock:
+            stages = dict((stage, {'seconds': round(seconds, 3), 'calls': self.calls[stage]})
+                          for stage, seconds in six.iteritems(self.seconds))
+        return(stages)